@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+异步IO引擎
+在一个事件循环线程中处理所有HTTP工作（目录二次请求、文件下载），并发数由信号量控制，可配置到数百；
+浏览器线程仍通过原有的 Queue 投递任务，由少量桥接线程转交给事件循环。
+需要 httpx（httpx.AsyncClient）；续传、分段和长度校验与 downloader 共用同一套实现
+"""
+
+import asyncio
+import threading
+
+from loguru import logger
+
+from downloader import (
+    expected_total,
+    temp_paths,
+    range_headers,
+    resume_plan,
+    finish_part,
+    segment_ranges,
+    load_segment_progress,
+    save_segment_progress,
+    check_segment,
+    finish_segments,
+    use_segments
+)
+from rate_limit import get_rate_limiter, raise_for_throttle
+from tracing import tracer
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class AsyncIOEngine:
+    """
+    基于asyncio的HTTP任务引擎
+    """
+
+    def __init__(self, concurrency=100, http2=False, timeout=60, chunk_size=1024 * 1024):
+        """
+        Args:
+            concurrency: 同时进行的HTTP任务数上限
+            http2: 是否使用HTTP/2（需要 httpx[http2]）
+            timeout: 请求超时时间（秒）
+            chunk_size: 下载时每次写入的块大小
+        """
+        self.concurrency = concurrency
+        self.http2 = http2
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+        self._client = None
+        self._semaphore = None
+
+    def start(self):
+        if httpx is None:
+            raise RuntimeError("异步IO引擎需要安装 httpx")
+        self._thread = threading.Thread(target=self._run_loop, name="aio-engine", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(), self.loop).result()
+        logger.info(f"异步IO引擎已启动，并发上限{self.concurrency}")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        try:
+            self._client = httpx.AsyncClient(http2=self.http2, limits=limits, timeout=self.timeout,
+                                             follow_redirects=True)
+        except ImportError:
+            # 未安装 h2 时不能启用HTTP/2
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True)
+
+    def consume(self, queue, handler, name="bridge"):
+        """
+        启动一个桥接线程，把同步 Queue 中的任务交给事件循环处理
+
+        并发已满时桥接线程会等待，任务留在 Queue 中，形成自然的背压
+
+        Args:
+            queue: 浏览器线程投递任务的 Queue
+            handler: 处理单个任务的协程函数
+        """
+        def bridge():
+            while True:
+                with tracer.span("queue_wait", "queue"):
+                    item = queue.get(block=True)
+                with tracer.span("admit_wait", "queue"):
+                    asyncio.run_coroutine_threadsafe(self._admit(handler, item, queue), self.loop).result()
+
+        threading.Thread(target=bridge, name=name, daemon=True).start()
+
+    async def _admit(self, handler, item, queue=None):
+        await self._semaphore.acquire()
+        self.loop.create_task(self._run(handler, item, queue))
+
+    async def _run(self, handler, item, queue=None):
+        try:
+            await handler(item)
+        except Exception as e:
+            logger.error(f"异步任务{item}出错：{e}")
+        finally:
+            self._semaphore.release()
+            # 任务处理完（后续任务已入队）才标记完成，供判定抓取是否结束
+            if queue is not None:
+                queue.task_done()
+
+    async def _acquire(self, endpoint):
+        limiter = get_rate_limiter()
+        while True:
+            wait = limiter.breaker.remaining() or limiter.bucket(endpoint).try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def call(self, endpoint, func, *args, desc="", **kwargs):
+        """
+        带限流和重试地执行协程函数，与 RateLimiter.call 的策略一致，但等待时不占用线程
+        """
+        limiter = get_rate_limiter()
+        last_err = None
+        for attempt in range(limiter.max_attempts):
+            await self._acquire(endpoint)
+            try:
+                result = await func(*args, **kwargs)
+                limiter.record_success()
+                return result
+            except Exception as e:
+                last_err = e
+                logger.error(f"{desc} 重试{attempt} 出错：{e}")
+                if attempt < limiter.max_attempts - 1:
+                    limiter.breaker.record_failure(getattr(e, "retry_after", None))
+                    await asyncio.sleep(limiter.backoff(attempt))
+        raise last_err
+
+    def _headers(self, headers, cookies):
+        headers = dict(headers or {})
+        if cookies:
+            headers["cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+        return headers
+
+    async def fetch_json(self, url, headers=None, cookies=None):
+        """
+        请求接口并返回JSON中的data字段
+        """
+        response = await self._client.get(url, headers=self._headers(headers, cookies))
+        raise_for_throttle(response)
+        return response.json()["data"]
+
+    def _stream(self, url, headers, cookies, byte_range=None):
+        return self._client.stream("GET", url, headers=range_headers(self._headers(headers, cookies), byte_range))
+
+    async def download_file(self, url, save_path, headers=None, cookies=None):
+        """
+        单连接流式下载，与 downloader.download_file 相同：写入 .part，长度校验后原子重命名，支持Range续传
+        """
+        save_path, part_path, _ = temp_paths(save_path)
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        async with self._stream(url, headers, cookies, f"bytes={offset}-" if offset else None) as response:
+            raise_for_throttle(response)
+            mode, expected = resume_plan(response, offset, part_path)
+            if mode:
+                with open(part_path, mode) as f:
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        f.write(chunk)
+        return finish_part(part_path, save_path, expected)
+
+    async def _download_segment(self, url, part_path, start, end, headers, cookies):
+        written = 0
+        async with self._stream(url, headers, cookies, f"bytes={start}-{end}") as response:
+            raise_for_throttle(response)
+            # 只接受206，避免把完整文件写到分段位置
+            if response.status_code == 206:
+                with open(part_path, "r+b") as f:
+                    f.seek(start)
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+        check_segment(start, end, response.status_code, written)
+
+    async def download_file_segmented(self, url, save_path, total, headers=None, cookies=None, segments=4):
+        """
+        分段并发下载，与 downloader.download_file_segmented 相同
+        """
+        save_path, part_path, progress_path = temp_paths(save_path)
+        ranges = segment_ranges(total, segments)
+        done = load_segment_progress(part_path, progress_path, total, ranges)
+        save_segment_progress(progress_path, total, ranges, done)
+
+        async def fetch_segment(i):
+            await self._download_segment(url, part_path, *ranges[i], headers, cookies)
+            done.add(i)
+            save_segment_progress(progress_path, total, ranges, done)
+
+        results = await asyncio.gather(*(fetch_segment(i) for i in range(len(ranges)) if i not in done),
+                                       return_exceptions=True)
+        errors = [x for x in results if isinstance(x, Exception)]
+        return finish_segments(errors, part_path, progress_path, save_path, total)
+
+    async def probe_size(self, url, headers=None, cookies=None):
+        async with self._stream(url, headers, cookies, "bytes=0-0") as response:
+            raise_for_throttle(response)
+            if response.status_code != 206:
+                return None
+            return expected_total(response, 0)
+
+    async def download(self, url, save_path, headers=None, cookies=None, segments=1,
+                       segment_threshold=64 * 1024 * 1024):
+        """
+        下载入口，与 downloader.download 的选择逻辑一致
+        """
+        save_path, part_path, progress_path = temp_paths(save_path)
+        if use_segments(part_path, progress_path, segments):
+            total = await self.probe_size(url, headers, cookies)
+            if total and total >= segment_threshold:
+                logger.info(f"分段下载{save_path.name}，大小{total}字节，分{segments}段")
+                return await self.download_file_segmented(url, save_path, total, headers, cookies, segments)
+        return await self.download_file(url, save_path, headers, cookies)
@@ -0,0 +1,5 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+离线基准测试：本地模拟服务（mock_server）和吞吐量测试（run）
+"""
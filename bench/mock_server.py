@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+本地模拟钉钉知识库服务
+按配置的深度和宽度生成目录树，提供：
+  /box/api/v2/dentry/list   分页的 dentry/list 接口（dentryUuid、loadMoreId 参数）
+  /files/<节点ID>            指定大小的文件内容，支持 Range
+  /i/nodes/<节点ID>          带 MAINSITE_CATALOG-node-tree-list 目录树和导出菜单的静态页面
+并可注入延迟、500 错误和 429 限流
+
+    python -m bench.mock_server --depth 3 --folders 4 --files 10 --port 8765
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+LIST_PATH = "/box/api/v2/dentry/list"
+ROOT_UUID = "root"
+# 普通上传文件（可直接下载）和需要在浏览器中导出的钉钉文档交替出现
+FILE_KINDS = (("pdf", "file"), ("adoc", "alidoc"))
+
+
+class TreeSpec:
+    """
+    合成目录树：每个文件夹下有 folders 个子文件夹（到 depth 层为止）和 files 个文件
+
+    节点ID编码了在树中的位置，例如 d-0-2 为根目录第1个子文件夹下的第3个子文件夹，
+    f-0-2-5 为该文件夹下的第6个文件，不需要在内存中保存整棵树
+    """
+
+    def __init__(self, depth=3, folders=4, files=10, file_size=256 * 1024, page_size=50):
+        self.depth = depth
+        self.folders = folders
+        self.files = files
+        self.file_size = file_size
+        self.page_size = page_size
+
+    @staticmethod
+    def path_of(uuid):
+        if uuid == ROOT_UUID:
+            return []
+        return [int(x) for x in uuid.split("-")[1:]]
+
+    @staticmethod
+    def folder_uuid(path):
+        return "d-" + "-".join(map(str, path)) if path else ROOT_UUID
+
+    def is_folder(self, uuid):
+        return uuid == ROOT_UUID or uuid.startswith("d-")
+
+    def ancestors(self, path):
+        return [{"dentryUuid": self.folder_uuid(path[:i]), "name": f"folder-{'-'.join(map(str, path[:i]))}"}
+                for i in range(1, len(path) + 1)]
+
+    def children(self, uuid):
+        """
+        文件夹的全部子节点（先文件夹后文件）
+        """
+        path = self.path_of(uuid)
+        ancestor_list = self.ancestors(path)
+        nodes = []
+        if len(path) < self.depth:
+            for i in range(self.folders):
+                child = path + [i]
+                nodes.append({"dentryUuid": self.folder_uuid(child), "name": f"folder-{'-'.join(map(str, child))}",
+                              "dentryType": "folder", "ancestorList": ancestor_list, "gmtModified": 0})
+        for i in range(self.files):
+            extension, content_type = FILE_KINDS[i % len(FILE_KINDS)]
+            file_uuid = "f-" + "-".join(map(str, path + [i]))
+            node = {"dentryUuid": file_uuid, "name": f"file-{file_uuid}.{extension}", "dentryType": "file",
+                    "contentType": content_type, "extension": extension, "ancestorList": ancestor_list,
+                    "gmtModified": 0}
+            if content_type == "file":
+                node["downloadUrl"] = f"/files/{file_uuid}"
+            nodes.append(node)
+        return nodes
+
+    def totals(self):
+        """
+        Returns:
+            tuple: (文件夹数（含根目录）, 文件数, 可直接下载的文件数)
+        """
+        folders = sum(self.folders ** d for d in range(self.depth + 1))
+        files = folders * self.files
+        direct = folders * sum(1 for i in range(self.files) if FILE_KINDS[i % len(FILE_KINDS)][1] == "file")
+        return folders, files, direct
+
+    def payload(self, uuid, start, end):
+        """
+        文件内容中 [start, end] 区间的字节，内容由节点ID确定
+        """
+        seed = (uuid.encode() + b"|") * 64
+        length = end - start + 1
+        offset = start % len(seed)
+        repeated = seed * ((offset + length) // len(seed) + 1)
+        return repeated[offset:offset + length]
+
+
+class Faults:
+    """
+    注入的延迟和错误
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, throttle_rate=0.0, retry_after=1, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """
+        Returns:
+            tuple: (延迟秒数, 要返回的错误状态码或None)
+        """
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return delay, 429
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, 500
+        return delay, None
+
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+.MAINSITE_CATALOG-node-tree-list {{ height: 480px; overflow-y: auto; width: 320px; float: left; }}
+.MAINSITE_CATALOG-node-tree-list > div {{ height: 32px; line-height: 32px; }}
+.menu {{ display: none; }}
+</style></head>
+<body>
+<div class="MAINSITE_CATALOG-node-tree-list">{rows}</div>
+<div id="doc">
+  <button data-testid="doc-header-more-button" onclick="show('menu-more')">更多</button>
+  <div class="menu" id="menu-more">
+    <div data-item-key="export" onclick="show('menu-export')">导出</div>
+    <div data-item-key="download" onclick="exportAs('download')">下载</div>
+  </div>
+  <div class="menu" id="menu-export">
+    <div data-item-key="exportAsWord" onclick="exportAs('docx')">Word</div>
+    <div data-item-key="exportAsPDF" onclick="exportAs('pdf')">PDF</div>
+  </div>
+</div>
+<script>
+function show(id) {{ document.getElementById(id).style.display = 'block'; }}
+function exportAs(kind) {{
+  // 模拟服务端导出耗时后开始下载
+  setTimeout(() => {{ location.href = '/files/{uuid}?export=' + kind; }}, {export_delay_ms});
+}}
+fetch('{list_path}?dentryUuid={parent}');
+</script>
+</body></html>
+"""
+
+
+class MockAlidocs:
+    """
+    模拟服务，在后台线程中运行
+    """
+
+    def __init__(self, spec=None, faults=None, host="127.0.0.1", port=0, export_delay_ms=200):
+        self.spec = spec or TreeSpec()
+        self.faults = faults or Faults()
+        self.export_delay_ms = export_delay_ms
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def list_url(self, uuid=ROOT_UUID):
+        return f"{self.base_url}{LIST_PATH}?dentryUuid={uuid}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="mock-alidocs", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def list_page(self, uuid, cursor):
+        children = self.spec.children(uuid)
+        start = int(cursor or 0)
+        end = start + self.spec.page_size
+        page = children[start:end]
+        for node in page:
+            if "downloadUrl" in node:
+                node["downloadUrl"] = self.base_url + node["downloadUrl"]
+        data = {"dentryUuid": uuid, "name": uuid, "children": page, "hasMore": end < len(children)}
+        if end < len(children):
+            data["loadMoreId"] = str(end)
+        return data
+
+    def page_html(self, uuid):
+        path = TreeSpec.path_of(uuid)
+        parent = TreeSpec.folder_uuid(path[:-1]) if path else ROOT_UUID
+        rows = "".join(f'<div data-rbd-draggable-id="{x["dentryUuid"]}">{x["name"]}</div>'
+                       for x in self.spec.children(parent))
+        return PAGE_TEMPLATE.format(title=uuid, rows=rows, uuid=uuid, parent=parent, list_path=LIST_PATH,
+                                    export_delay_ms=self.export_delay_ms)
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="application/json", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _fault(self):
+                delay, status = mock.faults.draw()
+                if delay:
+                    time.sleep(delay)
+                if status == 429:
+                    self._send(429, b'{"message": "throttled"}',
+                               headers={"Retry-After": str(mock.faults.retry_after)})
+                    return True
+                if status:
+                    self._send(status, b'{"message": "error"}')
+                    return True
+                return False
+
+            def do_GET(self):
+                mock.requests += 1
+                parts = urlsplit(self.path)
+                query = dict(parse_qsl(parts.query))
+                if parts.path == LIST_PATH:
+                    if self._fault():
+                        return
+                    uuid = query.get("dentryUuid", ROOT_UUID)
+                    if not mock.spec.is_folder(uuid):
+                        self._send(404, b'{"message": "not found"}')
+                        return
+                    body = json.dumps({"data": mock.list_page(uuid, query.get("loadMoreId"))}, ensure_ascii=False)
+                    self._send(200, body.encode("utf-8"))
+                elif parts.path.startswith("/files/"):
+                    if self._fault():
+                        return
+                    self._file(parts.path[len("/files/"):], query.get("export"))
+                elif parts.path.startswith("/i/nodes/") or parts.path.startswith("/i/spaces/"):
+                    uuid = parts.path.rstrip("/").split("/")[-1]
+                    if parts.path.startswith("/i/spaces/"):
+                        uuid = ROOT_UUID
+                    self._send(200, mock.page_html(uuid).encode("utf-8"), "text/html; charset=utf-8")
+                else:
+                    self._send(404, b'{"message": "not found"}')
+
+            do_HEAD = do_GET
+
+            def _file(self, uuid, export):
+                total = mock.spec.file_size
+                headers = {"Accept-Ranges": "bytes"}
+                if export:
+                    headers["Content-Disposition"] = f'attachment; filename="{uuid}.{export}"'
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)) if match.group(2) else total - 1, total - 1)
+                    if start >= total:
+                        self._send(416, headers={"Content-Range": f"bytes */{total}"})
+                        return
+                    headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+                    self._send(206, mock.spec.payload(uuid, start, end), "application/octet-stream", headers)
+                else:
+                    self._send(200, mock.spec.payload(uuid, 0, total - 1), "application/octet-stream", headers)
+
+        return Handler
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--depth", type=int, default=3, help="目录树深度")
+    parser.add_argument("--folders", type=int, default=4, help="每个文件夹下的子文件夹数")
+    parser.add_argument("--files", type=int, default=10, help="每个文件夹下的文件数")
+    parser.add_argument("--file-size", type=int, default=256 * 1024, help="文件大小（字节）")
+    parser.add_argument("--page-size", type=int, default=50, help="dentry/list 每页节点数")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟的随机波动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回429的比例")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def server_from_args(args, port=0):
+    spec = TreeSpec(args.depth, args.folders, args.files, args.file_size, args.page_size)
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, seed=args.seed)
+    return MockAlidocs(spec, faults, port=port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟钉钉知识库服务")
+    add_server_arguments(parser)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = server_from_args(args, args.port).start()
+    folders, files, direct = server.spec.totals()
+    print(f"模拟服务：{server.list_url()}  文件夹{folders}个 文件{files}个（可直接下载{direct}个）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+离线吞吐量基准测试
+启动本地模拟服务，分别测量三条路径的吞吐量和单次耗时分布：
+  listing   接口遍历（DentryLister）展开整棵目录树
+  download  普通文件直接下载（线程池或异步IO引擎，与正式运行相同的限流、重试和分段下载）
+  browser   浏览器打开文件页面、点击导出菜单直到下载完成（需要本机安装 Chrome/Chromium）
+
+    python -m bench.run --depth 3 --folders 4 --files 10 --latency-ms 20 --paths listing,download
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+from bench.mock_server import ROOT_UUID, add_server_arguments, server_from_args
+
+PATHS = ("listing", "download", "browser")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Recorder:
+    """
+    记录一条路径的完成数、字节数和每次操作的耗时
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.items = 0
+        self.failed = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self.started = None
+        self.finished = None
+
+    def begin(self):
+        self.started = time.perf_counter()
+
+    def end(self):
+        self.finished = time.perf_counter()
+
+    def add(self, latency, items=1, size=0, ok=True):
+        with self._lock:
+            self.latencies.append(latency)
+            if ok:
+                self.items += items
+                self.bytes += size
+            else:
+                self.failed += 1
+
+    def result(self, unit):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        p50, p99 = percentile(self.latencies, 0.5), percentile(self.latencies, 0.99)
+        return {
+            "path": self.name,
+            "unit": unit,
+            "items": self.items,
+            "failed": self.failed,
+            "elapsed": round(elapsed, 3),
+            "per_sec": round(self.items / elapsed, 2) if elapsed else 0,
+            "mb_per_sec": round(self.bytes / 1024 / 1024 / elapsed, 2) if elapsed else 0,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+        }
+
+
+def walk_files(server, content_type):
+    """
+    不经过HTTP遍历合成目录树，返回指定类型的文件节点
+    """
+    files = []
+    folders = [ROOT_UUID]
+    while folders:
+        for node in server.spec.children(folders.pop()):
+            if node["dentryType"] == "folder":
+                folders.append(node["dentryUuid"])
+            elif node["contentType"] == content_type:
+                if "downloadUrl" in node:
+                    node["downloadUrl"] = server.base_url + node["downloadUrl"]
+                files.append(node)
+    return files
+
+
+def bench_listing(server, workers, timeout):
+    from dentry_lister import DentryLister
+
+    folders_total, _, _ = server.spec.totals()
+    recorder = Recorder("listing")
+    lock = threading.Lock()
+    done = threading.Event()
+    state = {"folders": 0}
+
+    def finish_folder():
+        with lock:
+            state["folders"] += 1
+            if state["folders"] >= folders_total:
+                done.set()
+
+    def on_listed(data):
+        for node in data.get("children", []):
+            if node.get("dentryType") == "folder":
+                lister.submit(node)
+        with lock:
+            recorder.items += len(data.get("children", []))
+        if data.get("dentryUuid"):
+            finish_folder()
+
+    def on_failed(node_info):
+        with lock:
+            recorder.failed += 1
+        finish_folder()
+
+    lister = DentryLister(on_listed, on_failed, workers=workers)
+    fetch_page = lister.fetch_page
+
+    def timed_fetch(*args, **kwargs):
+        start = time.perf_counter()
+        data = fetch_page(*args, **kwargs)
+        with lock:
+            recorder.latencies.append(time.perf_counter() - start)
+        return data
+
+    lister.fetch_page = timed_fetch
+    lister.set_template(server.list_url(), {}, {})
+    recorder.begin()
+    lister.start()
+    lister.submit({"dentryUuid": ROOT_UUID, "name": "root"})
+    if not done.wait(timeout):
+        logger.warning(f"接口遍历{timeout}秒内未完成：已展开{state['folders']}/{folders_total}个文件夹")
+    recorder.end()
+    return recorder.result("nodes")
+
+
+def bench_download(server, workers, engine, segments, segment_threshold, timeout):
+    from downloader import download
+    from rate_limit import get_rate_limiter, ENDPOINT_DOWNLOAD
+
+    files = walk_files(server, "file")
+    recorder = Recorder(f"download[{engine}]")
+    target = Path(tempfile.mkdtemp(prefix="bench-download-"))
+
+    def saved_size(path):
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    try:
+        recorder.begin()
+        if engine == "asyncio":
+            from queue import Queue
+            from aio_engine import AsyncIOEngine
+
+            io_engine = AsyncIOEngine(concurrency=workers)
+            io_engine.start()
+
+            async def fetch(node):
+                path = str(target / f"{node['dentryUuid']}.pdf")
+                start = time.perf_counter()
+                try:
+                    await io_engine.call(ENDPOINT_DOWNLOAD, io_engine.download, node["downloadUrl"], path,
+                                         segments=segments, segment_threshold=segment_threshold,
+                                         desc=f"下载文件{node['downloadUrl']}")
+                    recorder.add(time.perf_counter() - start, size=saved_size(path))
+                except Exception:
+                    recorder.add(time.perf_counter() - start, ok=False)
+
+            # 与正式运行相同：文件经有界队列由桥接线程交给事件循环
+            queue = Queue(maxsize=workers * 2)
+            io_engine.consume(queue, fetch)
+            for node in files:
+                queue.put(node)
+            deadline = time.monotonic() + timeout
+            while queue.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.05)
+        else:
+            def fetch(node):
+                path = str(target / f"{node['dentryUuid']}.pdf")
+                start = time.perf_counter()
+                try:
+                    get_rate_limiter().call(ENDPOINT_DOWNLOAD, download, node["downloadUrl"], path,
+                                            segments=segments, segment_threshold=segment_threshold,
+                                            desc=f"下载文件{node['downloadUrl']}")
+                    recorder.add(time.perf_counter() - start, size=saved_size(path))
+                except Exception:
+                    recorder.add(time.perf_counter() - start, ok=False)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(fetch, files))
+        recorder.end()
+    finally:
+        shutil.rmtree(target, ignore_errors=True)
+    return recorder.result("files")
+
+
+def bench_browser(server, count, headless):
+    from DrissionPage import ChromiumPage, ChromiumOptions
+    from waits import PageWaiter
+
+    files = walk_files(server, "alidoc")[:count]
+    recorder = Recorder("browser")
+    target = Path(tempfile.mkdtemp(prefix="bench-browser-"))
+    options = ChromiumOptions().auto_port()
+    if headless:
+        options.headless()
+    try:
+        page = ChromiumPage(options)
+    except Exception as e:
+        print(f"无法启动浏览器，跳过 browser 测试：{e}")
+        shutil.rmtree(target, ignore_errors=True)
+        return None
+    waiter = PageWaiter(page)
+    try:
+        page.set.download_path(str(target))
+        recorder.begin()
+        for node in files:
+            start = time.perf_counter()
+            try:
+                # 与 Processer.process_file 中受限工具栏的导出步骤相同
+                page.set.download_file_name(node["dentryUuid"])
+                page.get(f"{server.base_url}/i/nodes/{node['dentryUuid']}")
+                waiter.page_ready()
+                page.ele("@data-testid=doc-header-more-button").click()
+                waiter.click("@data-item-key=export", "export_menu")
+                waiter.click("@data-item-key=exportAsWord", "export_word")
+                mission = waiter.download_begin()
+                if not mission:
+                    raise Exception("下载未开始")
+                mission.wait(show=False, timeout=60)
+                final_path = mission.final_path
+                ok = bool(final_path)
+                recorder.add(time.perf_counter() - start, size=os.path.getsize(final_path) if ok else 0, ok=ok)
+            except Exception as e:
+                logger.warning(f"浏览器导出{node['name']}失败：{e}")
+                recorder.add(time.perf_counter() - start, ok=False)
+        recorder.end()
+    finally:
+        try:
+            page.quit()
+        except Exception:
+            pass
+        shutil.rmtree(target, ignore_errors=True)
+    return recorder.result("files")
+
+
+def print_results(results):
+    print(f"\n{'路径':<20}{'完成':>8}{'失败':>6}{'耗时(s)':>10}{'个/秒':>10}{'MB/s':>8}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for r in results:
+        print(f"{r['path']:<20}{r['items']:>8}{r['failed']:>6}{r['elapsed']:>10}{r['per_sec']:>10}"
+              f"{r['mb_per_sec']:>8}{str(r['p50_ms']):>10}{str(r['p99_ms']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线吞吐量基准测试")
+    add_server_arguments(parser)
+    parser.add_argument("--paths", default="listing,download", help=f"要测试的路径，逗号分隔：{','.join(PATHS)}")
+    parser.add_argument("--workers", type=int, default=16, help="接口遍历线程数/下载并发数")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads", help="下载使用的IO方式")
+    parser.add_argument("--segments", type=int, default=4, help="大文件分段下载的连接数")
+    parser.add_argument("--segment-threshold", type=int, default=64 * 1024 * 1024, help="启用分段下载的文件大小")
+    parser.add_argument("--browser-files", type=int, default=20, help="browser 路径导出的文件数")
+    parser.add_argument("--show-browser", action="store_true", help="browser 路径使用可见浏览器")
+    parser.add_argument("--rate", type=float, default=0, help="接口和下载的限流（每秒请求数），默认不限流")
+    parser.add_argument("--timeout", type=float, default=600, help="每条路径的最长时间（秒）")
+    parser.add_argument("--json", default="", help="把结果写入该JSON文件")
+    parser.add_argument("--verbose", action="store_true", help="输出重试、限流等日志")
+    args = parser.parse_args()
+
+    # 限流器、连接池在第一次使用时按环境变量创建
+    os.environ["RATE_LIMIT_LIST"] = os.environ["RATE_LIMIT_DOWNLOAD"] = str(args.rate)
+    os.environ.setdefault("HTTP_POOL_SIZE", str(max(32, args.workers)))
+    os.environ.setdefault("RETRY_BASE_DELAY", "0.2")
+    # 注入错误时不要因熔断长时间暂停
+    os.environ.setdefault("BREAKER_RESET_TIMEOUT", "2")
+    logger.remove()
+    logger.add(sys.stderr, level="INFO" if args.verbose else "CRITICAL")
+
+    if args.engine == "asyncio" and importlib.util.find_spec("httpx") is None:
+        print("未安装 httpx，下载改用 threads 方式")
+        args.engine = "threads"
+    server = server_from_args(args).start()
+    folders, files, direct = server.spec.totals()
+    print(f"模拟服务：{server.base_url} 文件夹{folders}个 文件{files}个（可直接下载{direct}个） "
+          f"文件大小{args.file_size}字节 延迟{args.latency_ms}ms 错误率{args.error_rate} 限流率{args.throttle_rate}")
+
+    results = []
+    for path in [x.strip() for x in args.paths.split(",") if x.strip()]:
+        if path == "listing":
+            results.append(bench_listing(server, args.workers, args.timeout))
+        elif path == "download":
+            results.append(bench_download(server, args.workers, args.engine, args.segments,
+                                          args.segment_threshold, args.timeout))
+        elif path == "browser":
+            result = bench_browser(server, args.browser_files, not args.show_browser)
+            if result:
+                results.append(result)
+        else:
+            parser.error(f"未知的路径：{path}")
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    sys.stdout.flush()
+    # 接口遍历的工作线程不会退出，测试结束后直接结束进程
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
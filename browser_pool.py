@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+浏览器池模块
+按CPU和内存（或配置）确定浏览器数量，运行中根据待处理节点数扩缩容；
+定期检查每个浏览器：线程是否存活、单个节点是否处理过久、内存占用是否过高，
+卡住或崩溃的浏览器会被回收重建，正在处理的节点放回队列
+"""
+
+import os
+import threading
+import time
+
+from loguru import logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+    logger.warning("未安装 psutil，浏览器数量不按内存估算，也不检查浏览器内存占用（pip install psutil）")
+
+
+def auto_pool_size(memory_per_browser_mb=800, max_size=8):
+    """
+    按CPU核数和可用内存估算可同时运行的浏览器数量
+    """
+    size = os.cpu_count() or 2
+    if psutil is not None:
+        available_mb = psutil.virtual_memory().available / 1024 / 1024
+        size = min(size, int(available_mb // memory_per_browser_mb))
+    return max(1, min(size, max_size))
+
+
+def process_memory_mb(pid):
+    """
+    浏览器主进程及其所有子进程（渲染、GPU等）占用的内存（MB），无法获取时返回None
+    """
+    if psutil is None or not pid:
+        return None
+    try:
+        proc = psutil.Process(pid)
+        procs = [proc] + proc.children(recursive=True)
+        total = 0
+        for p in procs:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / 1024 / 1024
+    except psutil.Error:
+        return None
+
+
+def kill_process_tree(pid):
+    if psutil is None or not pid:
+        return
+    try:
+        proc = psutil.Process(pid)
+        for p in proc.children(recursive=True) + [proc]:
+            try:
+                p.kill()
+            except psutil.Error:
+                continue
+    except psutil.Error:
+        pass
+
+
+class BrowserPool:
+    """
+    浏览器工作线程池
+
+    工作对象需要提供：run() 主循环，stop 属性（置为True后处理完当前节点退出），finished 属性（正常退出），
+    current 属性（正在处理的节点），busy_since 属性（开始处理当前节点的时间），processed 属性（已处理节点数），
+    browser_pid() 浏览器进程号（用于检查内存），kill() 强制结束（浏览器进程或标签页）
+    """
+
+    def __init__(self, factory, size, min_size=1, max_size=8, on_lost=None, queue=None,
+                 stuck_timeout=600, max_memory_mb=2048, scale_up_queue=50, check_interval=30):
+        """
+        Args:
+            factory: 创建工作对象的函数，参数为浏览器编号
+            size: 初始浏览器数量
+            min_size/max_size: 扩缩容的范围
+            on_lost: 回收浏览器时对其正在处理的节点调用（放回队列）
+            queue: 待处理节点队列，用于按积压情况扩缩容，None 时不自动扩缩容
+            stuck_timeout: 单个节点处理超过该时间（秒）视为卡住
+            max_memory_mb: 单个浏览器占用内存超过该值时处理完当前节点后重建
+            scale_up_queue: 每个浏览器平均积压超过该数量时增加一个浏览器
+            check_interval: 健康检查间隔（秒）
+        """
+        self.factory = factory
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max(max_size, size)
+        self.on_lost = on_lost
+        self.queue = queue
+        self.stuck_timeout = stuck_timeout
+        self.max_memory_mb = max_memory_mb
+        self.scale_up_queue = scale_up_queue
+        self.check_interval = check_interval
+        # 创建工作对象时可能需要读取其他浏览器（如复制登录状态），使用可重入锁
+        self._lock = threading.RLock()
+        # 浏览器编号 -> (工作对象, 线程)
+        self._workers = {}
+        # 等待旧浏览器退出后重建的编号
+        self._replacing = set()
+        # 登录完成前不按积压情况扩缩容
+        self.scaling = False
+        self._idle_checks = 0
+        self.recycled = 0
+        self.started_at = time.monotonic()
+        # 已退出的工作对象处理的节点数
+        self._retired_processed = 0
+        # 关闭后不再检查、重建和扩缩容
+        self.closing = False
+
+    def start(self):
+        for _ in range(self.size):
+            self._spawn()
+        threading.Thread(target=self._monitor, name="browser-pool", daemon=True).start()
+
+    def _free_index(self):
+        index = 0
+        while index in self._workers:
+            index += 1
+        return index
+
+    def _spawn(self, index=None):
+        with self._lock:
+            index = self._free_index() if index is None else index
+            if index in self._workers:
+                self._retired_processed += self._workers[index][0].processed
+            worker = self.factory(index)
+            thread = threading.Thread(target=worker.run, name=f"browser-{index}", daemon=True)
+            self._workers[index] = (worker, thread)
+        thread.start()
+        logger.info(f"浏览器池：启动浏览器[{index}]，当前{len(self._workers)}个")
+        return worker
+
+    def workers(self):
+        with self._lock:
+            return [worker for worker, _ in self._workers.values()]
+
+    def alive(self):
+        """
+        仍在运行的浏览器数量
+        """
+        with self._lock:
+            return sum(1 for _, thread in self._workers.values() if thread.is_alive())
+
+    def resize(self, size):
+        """
+        运行中调整浏览器数量：增加时立即启动，减少时让编号最大的浏览器处理完当前节点后退出
+        """
+        size = max(self.min_size, min(self.max_size, size))
+        with self._lock:
+            active = sorted(index for index, (worker, thread) in self._workers.items()
+                            if thread.is_alive() and not worker.stop)
+        self.size = size
+        for _ in range(size - len(active)):
+            self._spawn()
+        for index in active[size:][::-1]:
+            logger.info(f"浏览器池：缩容，浏览器[{index}]处理完当前节点后退出")
+            self._workers[index][0].stop = True
+
+    def shutdown(self, timeout=60):
+        """
+        所有工作完成后关闭：停止检查和扩缩容，通知所有浏览器退出并等待关闭浏览器
+
+        Args:
+            timeout: 等待每个浏览器退出的最长时间（秒）
+        """
+        with self._lock:
+            self.closing = True
+            items = list(self._workers.values())
+        for worker, _ in items:
+            worker.stop = True
+        for worker, thread in items:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning("浏览器池：浏览器未在规定时间内退出，强制结束")
+                try:
+                    worker.kill()
+                except Exception:
+                    pass
+        logger.info("浏览器池：已关闭所有浏览器")
+
+    def recycle(self, index, reason):
+        """
+        回收卡住/崩溃的浏览器：结束浏览器进程，正在处理的节点放回队列，在同一编号上重建
+        """
+        with self._lock:
+            worker, thread = self._workers[index]
+            worker.stop = True
+        logger.warning(f"浏览器池：回收浏览器[{index}]（{reason}）")
+        self.recycled += 1
+        node_info = worker.current
+        # 节点交给 on_lost 处理，原线程结束时不再重复标记
+        worker.current = None
+        try:
+            worker.kill()
+        except Exception as e:
+            logger.info(f"浏览器池：结束浏览器[{index}]出错：{e}")
+        if node_info and self.on_lost:
+            self.on_lost(node_info)
+        self._spawn(index)
+
+    def check(self):
+        """
+        一次健康检查
+        """
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._workers.items())
+        for index, (worker, thread) in items:
+            if not thread.is_alive():
+                if not worker.stop and not worker.finished:
+                    self.recycle(index, "线程已退出")
+                elif index not in self._replacing:
+                    # 缩容或空闲退出的浏览器
+                    with self._lock:
+                        if self._workers.get(index, (None,))[0] is worker:
+                            self._retired_processed += worker.processed
+                            del self._workers[index]
+                continue
+            if worker.current and worker.busy_since and now - worker.busy_since > self.stuck_timeout:
+                self.recycle(index, f"节点{worker.current.get('name')}处理超过{self.stuck_timeout}秒")
+                continue
+            pid = worker.browser_pid()
+            memory = process_memory_mb(pid)
+            if memory and memory > self.max_memory_mb and not worker.stop:
+                # 内存过高不强制结束，处理完当前节点后退出，再启动新的浏览器；
+                # 多标签页模式下共用该浏览器的所有工作对象一起退出，结束浏览器进程后再重建，才能释放内存
+                group = [(i, w, t) for i, (w, t) in items
+                         if i == index or (t.is_alive() and not w.stop and w.browser_pid() == pid)]
+                logger.warning(f"浏览器池：浏览器[{','.join(str(i) for i, _, _ in group)}]占用内存{memory:.0f}MB，"
+                               f"处理完当前节点后重建")
+                for i, w, _ in group:
+                    w.stop = True
+                    self._replacing.add(i)
+                self.recycled += 1
+                threading.Thread(target=self._replace_after_exit, args=(group, pid), daemon=True).start()
+
+    def _replace_after_exit(self, group, pid):
+        for _, _, thread in group:
+            thread.join()
+        # 多标签页模式下工作对象只关闭自己的标签页，共用的浏览器进程在这里结束
+        if pid and (len(group) > 1 or (psutil is not None and psutil.pid_exists(pid))):
+            kill_process_tree(pid)
+        for index, _, _ in group:
+            if not self.closing:
+                self._spawn(index)
+            self._replacing.discard(index)
+
+    def autoscale(self):
+        """
+        积压的节点较多且内存充足时扩容，连续3次检查都没有积压时缩容，每次增减一个
+        """
+        if self.queue is None or not self.scaling:
+            return
+        pending = self.queue.qsize()
+        size = self.alive()
+        self._idle_checks = self._idle_checks + 1 if pending == 0 else 0
+        if pending > size * self.scale_up_queue and size < self.max_size:
+            if psutil is None or psutil.virtual_memory().available / 1024 / 1024 > self.max_memory_mb:
+                logger.info(f"浏览器池：待处理{pending}个节点，扩容到{size + 1}个浏览器")
+                self.resize(size + 1)
+        elif self._idle_checks >= 3 and size > self.min_size:
+            self._idle_checks = 0
+            self.resize(size - 1)
+
+    def memory_mb(self):
+        """
+        所有浏览器进程占用的内存（MB），多个工作对象共用一个浏览器时只计算一次
+        """
+        pids = {worker.browser_pid() for worker in self.workers()}
+        return sum(process_memory_mb(pid) or 0 for pid in pids if pid)
+
+    def log_summary(self):
+        """
+        输出浏览器数量、内存占用以及每GB内存每分钟处理的节点数（用于比较多浏览器与多标签页两种方式）
+        """
+        processed = self._retired_processed + sum(worker.processed for worker in self.workers())
+        memory = self.memory_mb()
+        minutes = (time.monotonic() - self.started_at) / 60
+        per_gb = processed / minutes / (memory / 1024) if memory and minutes else 0
+        logger.info(f"浏览器池：运行中{self.alive()}个 已回收{self.recycled}次 占用内存{memory:.0f}MB "
+                    f"已处理{processed}个节点 每GB内存每分钟处理{per_gb:.2f}个")
+
+    def _monitor(self):
+        while True:
+            time.sleep(self.check_interval)
+            if self.closing:
+                return
+            try:
+                self.check()
+                self.autoscale()
+            except Exception as e:
+                logger.error(f"浏览器池检查出错：{e}")
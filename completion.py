@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+完成判定模块
+统计各处理阶段尚未完成的工作（待处理节点、待重放的列表请求、待下载文件、进行中的导出、待展开的文件夹），
+每个工作在它产生的后续工作入队之后才记为完成，因此所有阶段同时为0即可确定抓取已全部完成，
+不再依赖空闲超时退出
+"""
+
+import threading
+import time
+
+from loguru import logger
+
+
+class CompletionTracker:
+    """
+    汇总各阶段未完成的工作数量，全部为0时判定完成
+    """
+
+    def __init__(self, settle=3.0, interval=0.5, log_interval=60):
+        """
+        Args:
+            settle: 所有阶段持续为0多长时间（秒）后判定完成，覆盖浏览器已收到但尚未取出的列表响应
+            interval: 检查间隔（秒）
+            log_interval: 输出未完成工作数量的间隔（秒）
+        """
+        self.settle = settle
+        self.interval = interval
+        self.log_interval = log_interval
+        self._lock = threading.Lock()
+        # 名称 -> 返回未完成数量的函数
+        self._sources = {}
+        # 名称 -> 手动占用的数量（如等待浏览器打开首页抓取根目录）
+        self._holds = {}
+        self.done = threading.Event()
+
+    def source(self, name, func):
+        """
+        登记一个阶段，func 返回该阶段未完成的工作数量
+        """
+        self._sources[name] = func
+
+    def hold(self, name):
+        """
+        手动占用一个工作，在 release 之前不会判定完成
+        """
+        with self._lock:
+            self._holds[name] = self._holds.get(name, 0) + 1
+
+    def release(self, name):
+        """
+        释放 hold 占用的工作，重复释放时忽略
+
+        Returns:
+            bool: 是否释放了占用
+        """
+        with self._lock:
+            if self._holds.get(name):
+                self._holds[name] -= 1
+                return True
+            return False
+
+    def outstanding(self):
+        """
+        各阶段未完成的工作数量（只包含不为0的阶段）
+        """
+        counts = {}
+        for name, func in list(self._sources.items()):
+            try:
+                value = func()
+            except Exception as e:
+                logger.warning(f"读取{name}的未完成数量出错：{e}")
+                value = 1
+            if value:
+                counts[name] = value
+        with self._lock:
+            counts.update({name: value for name, value in self._holds.items() if value})
+        return counts
+
+    def wait(self, alive=None, dead_grace=120):
+        """
+        阻塞直到所有阶段持续 settle 秒为0
+
+        Args:
+            alive: 返回是否还有工作线程在运行的函数，全部退出超过 dead_grace 秒（未被重建）时不再等待
+
+        Returns:
+            bool: 是否正常完成（False 表示工作线程已全部退出但仍有未完成的工作）
+        """
+        idle_since = None
+        dead_since = None
+        last_log = time.monotonic()
+        while True:
+            counts = self.outstanding()
+            now = time.monotonic()
+            if counts:
+                idle_since = None
+                if alive is not None and not alive():
+                    dead_since = dead_since or now
+                    if now - dead_since >= dead_grace:
+                        logger.error(f"工作线程已全部退出，仍有未完成的工作：{counts}")
+                        return False
+                else:
+                    dead_since = None
+                if now - last_log >= self.log_interval:
+                    last_log = now
+                    logger.info(f"未完成的工作：{counts}")
+            elif idle_since is None:
+                idle_since = now
+            elif now - idle_since >= self.settle:
+                logger.info("所有工作已完成")
+                self.done.set()
+                return True
+            time.sleep(self.interval)
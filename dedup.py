@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+内容去重模块
+下载完成的文件按内容哈希登记，内容相同的文件替换为指向第一份的硬链接（或reflink），
+链接文件（dlink）的源文件已经下载过时直接链接到链接文件的保存目录，不再导出
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from queue import Queue
+
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 fcntl，不支持 reflink
+    fcntl = None
+
+# Linux FICLONE ioctl（btrfs/xfs 等支持写时复制的文件系统）
+FICLONE = 0x40049409
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    计算文件内容的 sha256
+
+    Returns:
+        tuple: (十六进制哈希, 文件大小)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def link_file(src, dst, mode="hardlink"):
+    """
+    在 dst 创建与 src 内容相同的文件：reflink 模式先尝试写时复制，再尝试硬链接，都不支持时复制文件
+
+    Returns:
+        str: 实际使用的方式（reflink/hardlink/copy）
+    """
+    if mode == "reflink" and fcntl is not None:
+        try:
+            with open(src, "rb") as s, open(dst, "wb") as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return "reflink"
+        except OSError:
+            os.remove(dst)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+class ContentStore:
+    """
+    内容寻址存储，登记信息保存在抓取状态数据库中
+
+    下载完成的文件由单独的线程计算哈希，不占用下载线程和事件循环
+    """
+
+    def __init__(self, state_store, mode="hardlink"):
+        """
+        Args:
+            state_store: 抓取状态存储
+            mode: 重复文件的处理方式：hardlink、reflink 或 off（不去重）
+        """
+        self.state_store = state_store
+        self.mode = mode
+        self._queue = Queue()
+        self.linked = 0
+        self.saved_bytes = 0
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    def start(self):
+        if self.enabled:
+            threading.Thread(target=self._worker, name="dedup", daemon=True).start()
+
+    def submit(self, path):
+        """
+        登记一个下载完成的文件（异步处理）
+        """
+        if self.enabled and path:
+            self._queue.put(str(path))
+
+    def _worker(self):
+        while True:
+            path = self._queue.get()
+            try:
+                self.ingest(path)
+            except Exception as e:
+                logger.error(f"去重处理{path}出错：{e}")
+            finally:
+                self._queue.task_done()
+
+    def unfinished(self):
+        """
+        待处理和正在处理的文件数
+        """
+        return self._queue.unfinished_tasks
+
+    def ingest(self, path):
+        """
+        计算文件哈希；已有相同内容的文件时把该文件替换为链接，否则登记为该内容的第一份
+        """
+        if not os.path.isfile(path):
+            return
+        digest, size = file_digest(path)
+        known = self.state_store.content_path(digest)
+        if known:
+            canonical, canonical_size = known
+            if canonical != path and os.path.isfile(canonical) and os.path.getsize(canonical) == canonical_size:
+                if os.path.samefile(canonical, path):
+                    return
+                tmp = path + ".dedup"
+                try:
+                    how = link_file(canonical, tmp, self.mode)
+                    os.replace(tmp, path)
+                except OSError as e:
+                    logger.info(f"去重链接{path}失败，保留原文件：{e}")
+                    return
+                if how != "copy":
+                    self.linked += 1
+                    self.saved_bytes += size
+                    logger.info(f"{path} 与 {canonical} 内容相同，已替换为{how}")
+                return
+        self.state_store.record_content(digest, path, size)
+
+    def link_into(self, source, target_dir):
+        """
+        把已下载的源文件（文件或导出目录中的所有文件）链接到目标目录，用于链接文件（dlink）
+
+        Returns:
+            int: 链接的文件数，源文件不存在时为0
+        """
+        source = Path(source)
+        if source.is_dir():
+            files = [x for x in source.iterdir() if x.is_file()]
+        elif source.is_file():
+            files = [source]
+        else:
+            return 0
+        if not files:
+            return 0
+        target_dir = Path(target_dir)
+        os.makedirs(target_dir, exist_ok=True)
+        for src in files:
+            dst = target_dir.joinpath(src.name)
+            if dst.exists():
+                continue
+            how = link_file(str(src), str(dst), "hardlink" if self.mode == "off" else self.mode)
+            if how != "copy":
+                self.saved_bytes += src.stat().st_size
+        self.linked += len(files)
+        return len(files)
+
+    def log_summary(self):
+        if self.enabled:
+            logger.info(f"去重：已链接{self.linked}个文件，节省{self.saved_bytes / 1024 / 1024:.1f}MB")
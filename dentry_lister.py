@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+无浏览器目录遍历模块
+登录后复用浏览器抓到的 dentry/list 请求（请求头、cookies），直接通过HTTP并发遍历整个知识库
+"""
+
+from queue import Queue
+from threading import Thread, Event
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from loguru import logger
+
+from http_client import get_http_client
+from rate_limit import get_rate_limiter, raise_for_throttle, ENDPOINT_LIST
+from utils import filter_request_headers, cookies_to_dict
+
+
+class DentryLister:
+    """
+    基于 dentry/list 接口的目录遍历器
+
+    以浏览器抓到的第一个 dentry/list 请求为模板，替换其中的节点参数来请求任意文件夹，
+    并按游标翻页。多个工作线程并发请求，每得到一页结果就交给 on_listed 回调处理
+    """
+
+    def __init__(self, on_listed, on_failed, workers=16, uuid_param="dentryUuid",
+                 cursor_param="loadMoreId", has_more_key="hasMore", folder_queue=None):
+        """
+        Args:
+            on_listed: 列表回调，参数为接口返回的data（包含name、children）
+            on_failed: 某个文件夹多次请求失败后的回调，参数为文件夹节点信息
+            workers: 并发请求线程数
+            uuid_param: 请求中表示父节点的查询参数名
+            cursor_param: 翻页游标的查询参数名（返回数据中同名字段为下一页游标）
+            has_more_key: 返回数据中表示是否还有下一页的字段名
+            folder_queue: 待展开文件夹的队列（如超出上限后暂存到磁盘的队列），默认不限长度的 Queue；
+                工作线程展开文件夹时会提交子文件夹，不能使用有上限的队列
+        """
+        self.on_listed = on_listed
+        self.on_failed = on_failed
+        self.workers = workers
+        self.uuid_param = uuid_param
+        self.cursor_param = cursor_param
+        self.has_more_key = has_more_key
+        self.folder_queue = folder_queue if folder_queue is not None else Queue()
+        self.template_url = None
+        self.headers = {}
+        self.cookies = {}
+        self._ready = Event()
+        self._threads = []
+
+    def set_template(self, url, headers, cookies):
+        """
+        设置（或刷新）请求模板，浏览器每抓到一次 dentry/list 请求都可以调用以保持cookies最新
+        """
+        self.template_url = str(url)
+        self.headers = filter_request_headers(headers)
+        self.cookies = cookies_to_dict(cookies)
+        if not self._ready.is_set():
+            logger.info(f"接口遍历模式已就绪，模板请求：{self.template_url}")
+            self._ready.set()
+
+    def submit(self, node_info):
+        """
+        提交一个待展开的文件夹节点
+        """
+        self.folder_queue.put(node_info)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = Thread(target=self._worker, name=f"lister-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def build_url(self, dentry_uuid, cursor=None):
+        """
+        基于模板请求构造指定节点（及指定页）的 dentry/list 请求地址
+        """
+        parts = urlsplit(self.template_url)
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        query[self.uuid_param] = dentry_uuid
+        if cursor:
+            query[self.cursor_param] = cursor
+        else:
+            query.pop(self.cursor_param, None)
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+    def fetch_page(self, dentry_uuid, cursor=None):
+        url = self.build_url(dentry_uuid, cursor)
+
+        def fetch():
+            req = get_http_client().get(url, headers=self.headers, cookies=self.cookies)
+            raise_for_throttle(req)
+            return req.json()["data"]
+
+        try:
+            return get_rate_limiter().call(ENDPOINT_LIST, fetch, desc=f"接口遍历请求{url}")
+        except Exception:
+            return None
+
+    def list_folder(self, node_info):
+        """
+        按游标翻页请求一个文件夹的全部子节点，每页交给回调处理
+
+        Returns:
+            bool: 是否全部页都请求成功
+        """
+        dentry_uuid = node_info['dentryUuid']
+        cursor = None
+        seen_cursors = set()
+        while True:
+            data = self.fetch_page(dentry_uuid, cursor)
+            if data is None:
+                return False
+            data.setdefault('name', node_info.get('name', ''))
+            # 翻页时返回数据可能不带父节点uuid，补齐后便于标记文件夹状态
+            data.setdefault('dentryUuid', dentry_uuid)
+            cursor = data.get(self.cursor_param)
+            has_more = data.get(self.has_more_key, bool(cursor))
+            if not (has_more and cursor) or cursor in seen_cursors:
+                # 最后一页才交给回调，避免文件夹在未取完子节点前被标记为已展开
+                self.on_listed(data)
+                return True
+            seen_cursors.add(cursor)
+            page_data = dict(data)
+            page_data.pop('dentryUuid')
+            self.on_listed(page_data)
+
+    def _worker(self):
+        self._ready.wait()
+        while True:
+            node_info = self.folder_queue.get(block=True)
+            try:
+                if not self.list_folder(node_info):
+                    logger.error(f"接口遍历文件夹{node_info.get('name')}失败，交回浏览器处理")
+                    self.on_failed(node_info)
+            except Exception as e:
+                logger.error(f"接口遍历文件夹{node_info.get('name')}出错：{e}")
+                self.on_failed(node_info)
+            finally:
+                self.folder_queue.task_done()
+
+    def unfinished(self):
+        """
+        待展开和正在展开的文件夹数
+        """
+        return self.folder_queue.unfinished_tasks
+
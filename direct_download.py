@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+直接下载模块
+普通上传的文件（pdf、zip、图片、以文件形式存储的docx/xlsx等）不需要服务端转换，
+从节点信息或下载地址接口中取得下载地址后直接交给HTTP下载线程，不再经过浏览器
+"""
+
+import os
+
+from loguru import logger
+
+from http_client import get_http_client
+from rate_limit import get_rate_limiter, raise_for_throttle, ENDPOINT_DOWNLOAD
+
+# 可以直接下载的文件类型
+DEFAULT_DIRECT_TYPES = ("pdf,zip,rar,7z,tar,gz,jpg,jpeg,png,gif,bmp,svg,webp,"
+                        "docx,doc,xlsx,xls,csv,pptx,ppt,txt,md,log")
+
+
+class DirectDownloadResolver:
+    """
+    下载地址解析器
+
+    依次尝试：节点信息中的下载地址字段；配置的下载地址接口（返回JSON时取其中的地址字段，
+    返回文件内容时接口地址本身就是下载地址）
+    """
+
+    def __init__(self, api_template="", url_keys="downloadUrl", file_types=DEFAULT_DIRECT_TYPES):
+        """
+        Args:
+            api_template: 下载地址接口模板，可使用节点信息中的字段，如 {dentryUuid}
+            url_keys: 节点信息及接口返回数据中表示下载地址的字段名，逗号分隔
+            file_types: 可直接下载的文件类型，逗号分隔
+        """
+        self.api_template = api_template
+        self.url_keys = [x.strip() for x in url_keys.split(",") if x.strip()]
+        self.file_types = {x.strip().lower() for x in file_types.split(",") if x.strip()}
+
+    @property
+    def enabled(self):
+        return bool(self.file_types)
+
+    def is_native_file(self, node_info):
+        """
+        是否为普通上传的文件（钉钉文档/表格及链接文件需要浏览器导出）
+        """
+        if node_info.get('contentType') == 'alidoc':
+            return False
+        file_type = node_info.get('name', '').rsplit(".", 1)[-1].lower()
+        return file_type in self.file_types
+
+    def _find_url(self, data):
+        if isinstance(data, str) and data.startswith("http"):
+            return data
+        if isinstance(data, dict):
+            for key in self.url_keys:
+                if isinstance(data.get(key), str) and data[key].startswith("http"):
+                    return data[key]
+        return None
+
+    def resolve(self, node_info, headers, cookies):
+        """
+        解析节点的下载地址
+
+        Returns:
+            str|None: 下载地址，无法解析时返回None（由浏览器处理）
+        """
+        url = self._find_url(node_info)
+        if url or not self.api_template:
+            return url
+        try:
+            api_url = self.api_template.format(**node_info)
+        except (KeyError, IndexError, ValueError) as e:
+            logger.info(f"无法按 DIRECT_DOWNLOAD_API 构造{node_info.get('name')}的下载地址接口，交由浏览器处理：{e}")
+            return None
+
+        def fetch():
+            with get_http_client().stream("get", api_url, headers=headers, cookies=cookies) as response:
+                raise_for_throttle(response)
+                if response.status_code != 200:
+                    raise Exception(f"请求下载地址返回状态码{response.status_code}")
+                if "json" not in response.headers.get("Content-Type", ""):
+                    # 接口直接返回文件内容，接口地址即下载地址
+                    return api_url
+                if hasattr(response, "read"):
+                    # httpx 的流式响应需要先读取完整内容
+                    response.read()
+                body = response.json()
+            return self._find_url(body.get("data", body) if isinstance(body, dict) else body)
+
+        try:
+            return get_rate_limiter().call(ENDPOINT_DOWNLOAD, fetch, attempts=3,
+                                           desc=f"获取{node_info.get('name')}下载地址")
+        except Exception as e:
+            logger.info(f"获取{node_info.get('name')}下载地址失败，交由浏览器处理：{e}")
+            return None
+
+
+def resolver_from_env():
+    return DirectDownloadResolver(
+        api_template=os.getenv("DIRECT_DOWNLOAD_API", ""),
+        url_keys=os.getenv("DIRECT_DOWNLOAD_URL_KEYS", "downloadUrl"),
+        file_types=os.getenv("DIRECT_DOWNLOAD_TYPES", DEFAULT_DIRECT_TYPES),
+    )
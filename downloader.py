@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+文件下载模块
+流式分块写入临时文件，校验长度后原子重命名；中断的下载通过HTTP Range请求续传，
+大文件可拆分为多个字节区间并发下载
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from loguru import logger
+
+from http_client import get_http_client
+from rate_limit import raise_for_throttle, ThrottledError
+
+# 未完成下载的临时文件后缀
+PART_SUFFIX = ".part"
+# 分段下载的进度文件后缀，记录已完成的分段
+SEGMENTS_SUFFIX = ".part.json"
+
+
+class DownloadError(Exception):
+    """
+    下载失败（状态码异常或长度校验不通过），临时文件会保留用于续传
+    """
+
+
+def expected_total(response, offset):
+    """
+    根据响应头计算文件完整大小，无法确定时返回None
+    """
+    content_range = response.headers.get("Content-Range")
+    if content_range:
+        match = re.match(r"bytes\s+(?:\d+-\d+|\*)/(\d+|\*)", content_range)
+        if match and match.group(1) != "*":
+            return int(match.group(1))
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None:
+        return offset + int(content_length)
+    return None
+
+
+def temp_paths(save_path):
+    """
+    Returns:
+        tuple: (正式文件, 临时文件, 分段进度文件) 的路径
+    """
+    save_path = Path(save_path)
+    return (save_path, save_path.with_name(save_path.name + PART_SUFFIX),
+            save_path.with_name(save_path.name + SEGMENTS_SUFFIX))
+
+
+def range_headers(headers, byte_range=None):
+    """
+    下载请求头：要求服务端不压缩，保证写入的字节数可以和Content-Length比对；可选Range
+    """
+    request_headers = dict(headers or {})
+    request_headers["Accept-Encoding"] = "identity"
+    if byte_range:
+        request_headers["Range"] = byte_range
+    return request_headers
+
+
+def resume_plan(response, offset, part_path):
+    """
+    根据（续传）请求的响应决定临时文件的写入方式
+
+    Returns:
+        tuple: (写入模式, 文件完整大小)，写入模式为None时临时文件已完整，不需要写入
+    """
+    if response.status_code == 416 and offset:
+        # 请求范围超出文件大小，说明临时文件可能已经完整，以 Content-Range 中的总长度为准
+        expected = expected_total(response, 0) if response.headers.get("Content-Range") else None
+        if expected is None or expected != offset:
+            part_path.unlink()
+            raise DownloadError("续传范围无效，已删除临时文件重新下载")
+        return None, expected
+    if response.status_code == 206:
+        return "ab", expected_total(response, offset)
+    if response.status_code == 200:
+        # 服务端不支持Range或没有临时文件，从头下载
+        return "wb", expected_total(response, 0)
+    raise DownloadError(f"下载失败，返回状态码{response.status_code}")
+
+
+def finish_part(part_path, save_path, expected):
+    """
+    校验临时文件长度后原子重命名为正式文件
+
+    Returns:
+        int: 文件大小（字节）
+    """
+    size = part_path.stat().st_size
+    if expected is not None and size != expected:
+        if size > expected:
+            part_path.unlink()
+        raise DownloadError(f"文件长度校验失败，已下载{size}字节，应为{expected}字节")
+    os.replace(part_path, save_path)
+    return size
+
+
+def download_file(url, save_path, headers=None, cookies=None, chunk_size=1024 * 1024):
+    """
+    流式下载文件到 save_path
+
+    数据先写入 save_path.part，下载完成且长度与服务端声明一致后才重命名为正式文件；
+    若已存在 .part 文件，则带 Range 头从已下载的位置继续
+
+    Args:
+        url: 下载地址
+        save_path: 最终保存路径
+        headers: 请求头
+        cookies: cookies字典
+        chunk_size: 每次写入的块大小
+
+    Returns:
+        int: 文件大小（字节）
+    """
+    client = get_http_client()
+    save_path, part_path, _ = temp_paths(save_path)
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    request_headers = range_headers(headers, f"bytes={offset}-" if offset else None)
+
+    with client.stream("get", url, headers=request_headers, cookies=cookies) as response:
+        raise_for_throttle(response)
+        mode, expected = resume_plan(response, offset, part_path)
+        if mode == "ab":
+            logger.info(f"续传{save_path.name}，从{offset}字节继续")
+        if mode:
+            with open(part_path, mode) as f:
+                for chunk in client.iter_chunks(response, chunk_size):
+                    f.write(chunk)
+    return finish_part(part_path, save_path, expected)
+
+
+def probe_size(url, headers=None, cookies=None):
+    """
+    用 bytes=0-0 的Range请求探测文件大小及是否支持区间下载
+    （签名下载地址通常只对GET有效，因此不用HEAD）
+
+    Returns:
+        int|None: 支持区间下载时返回文件大小，否则返回None
+    """
+    client = get_http_client()
+    with client.stream("get", url, headers=range_headers(headers, "bytes=0-0"), cookies=cookies) as response:
+        raise_for_throttle(response)
+        if response.status_code != 206:
+            return None
+        return expected_total(response, 0)
+
+
+def segment_ranges(total, segments):
+    segment_size = -(-total // segments)
+    return [(start, min(start + segment_size, total) - 1) for start in range(0, total, segment_size)]
+
+
+def load_segment_progress(part_path, progress_path, total, ranges):
+    """
+    读取已完成的分段；没有可用的进度时预分配临时文件，各分段直接写入各自的位置
+
+    Returns:
+        set: 已完成的分段序号
+    """
+    done = set()
+    if part_path.exists() and progress_path.exists():
+        progress = json.loads(progress_path.read_text(encoding="utf-8"))
+        if progress.get("total") == total and progress.get("segments") == len(ranges):
+            done = set(progress.get("done", []))
+    if not done:
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+    return done
+
+
+def save_segment_progress(progress_path, total, ranges, done):
+    progress_path.write_text(json.dumps({"total": total, "segments": len(ranges), "done": sorted(done)}),
+                             encoding="utf-8")
+
+
+def check_segment(start, end, status, written):
+    if status != 206:
+        raise DownloadError(f"分段{start}-{end}下载失败，返回状态码{status}")
+    if written != end - start + 1:
+        raise DownloadError(f"分段{start}-{end}长度校验失败，已下载{written}字节")
+
+
+def finish_segments(errors, part_path, progress_path, save_path, total):
+    """
+    所有分段结束后：有失败的分段时抛出异常（限流优先，便于按服务端要求等待），否则校验长度并重命名
+
+    Returns:
+        int: 文件大小（字节）
+    """
+    if errors:
+        for err in errors:
+            if isinstance(err, ThrottledError):
+                raise err
+        raise DownloadError(f"{len(errors)}个分段下载失败：{errors[0]}")
+    size = finish_part(part_path, save_path, total)
+    progress_path.unlink()
+    return size
+
+
+def use_segments(part_path, progress_path, segments):
+    """
+    是否尝试分段下载：已有单连接下载留下的临时文件时，继续用单连接续传
+    """
+    return segments > 1 and not (part_path.exists() and not progress_path.exists())
+
+
+def _download_segment(url, part_path, start, end, headers, cookies, chunk_size):
+    client = get_http_client()
+    written = 0
+    with client.stream("get", url, headers=range_headers(headers, f"bytes={start}-{end}"),
+                       cookies=cookies) as response:
+        raise_for_throttle(response)
+        # 只接受206，避免把完整文件写到分段位置
+        if response.status_code == 206:
+            with open(part_path, "r+b") as f:
+                f.seek(start)
+                for chunk in client.iter_chunks(response, chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+    check_segment(start, end, response.status_code, written)
+
+
+def download_file_segmented(url, save_path, total, headers=None, cookies=None, segments=4,
+                            chunk_size=1024 * 1024):
+    """
+    将文件按字节区间拆分为 segments 段并发下载，写入预分配好大小的临时文件
+
+    已完成的分段记录在 save_path.part.json 中，重试时只下载未完成的分段
+
+    Args:
+        url: 下载地址
+        save_path: 最终保存路径
+        total: 文件大小（字节），由 probe_size 获得
+        headers: 请求头
+        cookies: cookies字典
+        segments: 分段数（即单个文件的并发连接数）
+        chunk_size: 每次写入的块大小
+
+    Returns:
+        int: 文件大小（字节）
+    """
+    save_path, part_path, progress_path = temp_paths(save_path)
+    ranges = segment_ranges(total, segments)
+    done = load_segment_progress(part_path, progress_path, total, ranges)
+    save_segment_progress(progress_path, total, ranges, done)
+    pending = [i for i in range(len(ranges)) if i not in done]
+    if len(pending) < len(ranges):
+        logger.info(f"续传{save_path.name}，剩余{len(pending)}/{len(ranges)}个分段")
+    errors = []
+    with ThreadPoolExecutor(max_workers=len(pending) or 1) as executor:
+        futures = {executor.submit(_download_segment, url, part_path, *ranges[i], headers, cookies, chunk_size): i
+                   for i in pending}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                done.add(futures[future])
+                save_segment_progress(progress_path, total, ranges, done)
+            except Exception as e:
+                errors.append(e)
+    return finish_segments(errors, part_path, progress_path, save_path, total)
+
+
+def download(url, save_path, headers=None, cookies=None, segments=1, segment_threshold=64 * 1024 * 1024):
+    """
+    下载入口：文件大小超过 segment_threshold 且服务端支持区间请求时分段并发下载，否则单连接流式下载
+
+    Args:
+        url: 下载地址
+        save_path: 最终保存路径
+        headers: 请求头
+        cookies: cookies字典
+        segments: 单个文件的最大并发连接数，为1时不分段
+        segment_threshold: 启用分段下载的文件大小阈值（字节）
+
+    Returns:
+        int: 文件大小（字节）
+    """
+    save_path, part_path, progress_path = temp_paths(save_path)
+    if use_segments(part_path, progress_path, segments):
+        total = probe_size(url, headers, cookies)
+        if total and total >= segment_threshold:
+            logger.info(f"分段下载{save_path.name}，大小{total}字节，分{segments}段")
+            return download_file_segmented(url, save_path, total, headers, cookies, segments)
+    return download_file(url, save_path, headers, cookies)
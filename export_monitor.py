@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+导出完成监视模块
+浏览器触发导出、下载任务开始后即可处理下一个节点，下载任务的完成情况由监视线程统一轮询，
+完成或失败时回调处理（记录状态、交给HTTP下载线程重试）
+"""
+
+import threading
+import time
+
+from loguru import logger
+
+
+class ExportMonitor:
+    """
+    轮询所有浏览器的下载任务，任务结束后调用对应的回调
+    """
+
+    def __init__(self, interval=0.5, timeout=1800):
+        """
+        Args:
+            interval: 轮询间隔（秒）
+            timeout: 单个下载任务的最长时间（秒），超时后取消并按失败处理，0为不限
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._missions = []
+        # 已结束、回调尚未执行完的任务数
+        self._settling = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        threading.Thread(target=self._run, name="export-monitor", daemon=True).start()
+
+    def track(self, mission, on_done, on_finish=None):
+        """
+        登记一个已开始的下载任务
+
+        Args:
+            mission: 浏览器下载任务
+            on_done: 任务结束后的回调，参数为下载任务、是否超时和耗时（秒）
+            on_finish: 回调执行后调用（如释放浏览器的导出名额），回调出错时同样会调用
+        """
+        with self._lock:
+            self._missions.append((mission, on_done, on_finish, time.monotonic()))
+
+    def pending(self):
+        with self._lock:
+            return len(self._missions)
+
+    def unfinished(self):
+        """
+        进行中和回调尚未执行完的任务数，回调中产生的后续任务（如HTTP重新下载）入队后才减少
+        """
+        with self._lock:
+            return len(self._missions) + self._settling
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                finished = []
+                running = []
+                for entry in self._missions:
+                    mission, _, _, started = entry
+                    if mission.is_done:
+                        finished.append((entry, False))
+                    elif self.timeout and now - started > self.timeout:
+                        finished.append((entry, True))
+                    else:
+                        running.append(entry)
+                self._missions = running
+                self._settling += len(finished)
+            for (mission, on_done, on_finish, started), timed_out in finished:
+                if timed_out:
+                    logger.warning(f"下载任务{mission.url}超过{self.timeout}秒未完成，取消")
+                    try:
+                        mission.cancel()
+                    except Exception:
+                        pass
+                if mission.final_path or mission.state == "skipped":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                try:
+                    on_done(mission, timed_out, now - started)
+                except Exception as e:
+                    logger.error(f"处理下载任务{mission.url}结果出错：{e}")
+                finally:
+                    if on_finish:
+                        on_finish()
+                    with self._lock:
+                        self._settling -= 1
+            time.sleep(self.interval)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+共享HTTP连接池模块
+所有HTTP工作线程（二次请求、目录遍历、文件下载）共用一个带连接池的会话，
+复用keep-alive连接避免每次请求重新握手；安装了 httpx[http2] 时可选用HTTP/2
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+
+try:
+    import httpx
+    import h2  # noqa: F401  httpx 的HTTP/2支持依赖 h2
+except ImportError:
+    httpx = None
+
+
+class HttpClient:
+    """
+    连接池化的HTTP客户端
+
+    默认使用 requests.Session + HTTPAdapter，每个主机维护一个大小为 pool_size 的连接池；
+    http2=True 且安装了 httpx[http2] 时改用 httpx.Client(http2=True)
+    """
+
+    def __init__(self, pool_size=32, pool_hosts=10, http2=False, timeout=60):
+        """
+        Args:
+            pool_size: 每个主机保持的最大连接数
+            pool_hosts: 缓存连接池的主机数
+            http2: 是否尝试使用HTTP/2
+            timeout: 默认超时时间（秒）
+        """
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._request_count = 0
+        if http2 and httpx is None:
+            logger.warning("未安装 httpx[http2]，HTTP/2 不可用，回退到 HTTP/1.1 连接池")
+        self.http2 = bool(http2 and httpx is not None)
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=pool_size * pool_hosts,
+                                    max_keepalive_connections=pool_size * pool_hosts),
+                timeout=timeout,
+                follow_redirects=True,
+            )
+        else:
+            self._client = requests.Session()
+            self._adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+            self._client.mount("https://", self._adapter)
+            self._client.mount("http://", self._adapter)
+
+    def request(self, method, url, headers=None, cookies=None, **kwargs):
+        """
+        发送请求，参数与 requests.request 一致；返回的响应对象都提供 status_code、headers、content、json()
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self._request_count += 1
+        if self.http2:
+            # httpx 不支持按请求传cookies，直接拼进请求头
+            headers = dict(headers or {})
+            if cookies:
+                headers["cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+            return self._client.request(method, url, headers=headers, **kwargs)
+        return self._client.request(method, url, headers=headers, cookies=cookies, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    @contextmanager
+    def stream(self, method, url, headers=None, cookies=None, **kwargs):
+        """
+        以流式方式发送请求，响应体不会一次性读入内存，配合 iter_chunks 分块读取
+        """
+        if self.http2:
+            kwargs.setdefault("timeout", self.timeout)
+            with self._lock:
+                self._request_count += 1
+            headers = dict(headers or {})
+            if cookies:
+                headers["cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+            with self._client.stream(method, url, headers=headers, **kwargs) as response:
+                yield response
+        else:
+            response = self.request(method, url, headers=headers, cookies=cookies, stream=True, **kwargs)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def iter_chunks(self, response, chunk_size):
+        if self.http2:
+            return response.iter_bytes(chunk_size)
+        return response.iter_content(chunk_size)
+
+    def stats(self):
+        """
+        连接复用统计
+
+        Returns:
+            dict: requests 请求数，connections 新建连接数，reuse_ratio 连接复用率
+        """
+        connections = None
+        if self.http2:
+            try:
+                # httpcore 未公开连接计数，只能读取当前连接池中的连接数
+                connections = len(self._client._transport._pool.connections)
+            except AttributeError:
+                pass
+        else:
+            pools = self._adapter.poolmanager.pools
+            connections = sum(pools[key].num_connections for key in list(pools.keys()))
+        requests_made = self._request_count
+        reuse_ratio = None
+        if connections is not None and requests_made:
+            reuse_ratio = round(1 - connections / requests_made, 4)
+        return {"requests": requests_made, "connections": connections, "reuse_ratio": reuse_ratio}
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(f"HTTP连接池：{'HTTP/2' if self.http2 else 'HTTP/1.1'} 请求数{stats['requests']} "
+                    f"新建连接数{stats['connections']} 连接复用率{stats['reuse_ratio']}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """
+    获取进程内共享的HTTP客户端，首次调用时按 .env 配置创建
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(
+                pool_size=int(os.getenv("HTTP_POOL_SIZE", "32")),
+                pool_hosts=int(os.getenv("HTTP_POOL_HOSTS", "10")),
+                http2=os.getenv("HTTP2", "0") == "1",
+                timeout=float(os.getenv("HTTP_TIMEOUT", "60")),
+            )
+        return _client
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+结果日志模块
+所有线程记录的处理结果（完成、失败、无权限、跳过、上游删除）先放入有界缓冲区，由一个写线程批量写入
+结构化的 JSONL 日志及原有的文本日志，定期 fsync；内存中按类型保存有序集合，去重为O(1)
+（完成记录数量与节点数相同，不保存在内存中，也不写文本日志）
+"""
+
+import json
+import os
+import threading
+import time
+from queue import Queue, Empty
+
+from loguru import logger
+
+# 结果类型
+KIND_DONE = "done"
+KIND_FAILED = "failed"
+KIND_NO_RIGHT = "no_right"
+KIND_SKIPPED = "skipped"
+KIND_DELETED = "deleted"
+
+# 结果类型 -> (文本日志文件, 信息元组各字段名)
+KIND_LOGS = {
+    KIND_DONE: (None, ("name", "type", "output")),
+    KIND_FAILED: ("failed_files.log", ("name", "url", "reason")),
+    KIND_NO_RIGHT: ("no_right_files.log", ("path", "name", "type")),
+    KIND_SKIPPED: ("skipped_files.log", ("name", "type", "reason")),
+    KIND_DELETED: ("deleted_files.log", ("name", "uuid", "output")),
+}
+
+
+def format_log_line(kind, info, timestamp):
+    """
+    按原有文本日志的格式生成一行
+    """
+    if kind == KIND_FAILED:
+        name, url_or_type, reason = info
+        return f"[{timestamp}] {name} | {reason} | {url_or_type}\n"
+    if kind == KIND_NO_RIGHT:
+        path, name, ftype = info
+        return f"[{timestamp}] [{ftype}] {path}/{name}\n"
+    if kind == KIND_SKIPPED:
+        name, ftype, reason = info
+        return f"[{timestamp}] [{ftype}] {name} | {reason}\n"
+    name, node_uuid, output = info
+    return f"[{timestamp}] {name} | {node_uuid} | {output}\n"
+
+
+class ResultJournal:
+    """
+    单写线程的结果日志
+    """
+
+    def __init__(self, path="results.jsonl", buffer_size=10000, fsync_interval=5.0):
+        """
+        Args:
+            path: JSONL 日志文件
+            buffer_size: 缓冲区容量，写线程跟不上时记录结果的线程会等待
+            fsync_interval: fsync 的间隔（秒）
+        """
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._queue = Queue(maxsize=buffer_size)
+        self._lock = threading.Lock()
+        # 结果类型 -> 信息元组的有序集合（dict 的键）
+        self.entries = {kind: {} for kind, (log_file, _) in KIND_LOGS.items() if log_file}
+        self.counts = dict.fromkeys(KIND_LOGS, 0)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._writer, name="journal", daemon=True)
+        self._thread.start()
+
+    def record(self, kind, info, **fields):
+        """
+        记录一条结果，同类型中相同的信息只记录一次（完成记录不去重）
+
+        Args:
+            kind: 结果类型
+            info: 信息元组（与原文本日志的字段一致）
+            fields: 附加字段，如 uuid、folder、bytes、duration
+
+        Returns:
+            bool: 是否为新记录
+        """
+        with self._lock:
+            entries = self.entries.get(kind)
+            if entries is not None:
+                if info in entries:
+                    return False
+                entries[info] = None
+            self.counts[kind] += 1
+        self._queue.put((time.time(), kind, info, fields))
+        return True
+
+    def count(self, kind):
+        return self.counts[kind]
+
+    def _write_batch(self, batch, journal_file, log_files):
+        for ts, kind, info, fields in batch:
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+            record = {"ts": ts, "kind": kind}
+            record.update(zip(KIND_LOGS[kind][1], info))
+            record.update(fields)
+            journal_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if kind in log_files:
+                log_files[kind].write(format_log_line(kind, info, timestamp))
+
+    def _writer(self):
+        journal_file = open(self.path, "a", encoding="utf-8")
+        log_files = {kind: open(log_file, "a", encoding="utf-8")
+                     for kind, (log_file, _) in KIND_LOGS.items() if log_file}
+        files = [journal_file] + list(log_files.values())
+        last_sync = time.monotonic()
+        closing = False
+        while not closing:
+            try:
+                item = self._queue.get(timeout=1)
+            except Empty:
+                item = ()
+            batch = []
+            while item is not None:
+                if item:
+                    batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except Empty:
+                    break
+            else:
+                # 收到 close() 的结束标记
+                closing = True
+            try:
+                if batch:
+                    self._write_batch(batch, journal_file, log_files)
+                    for f in files:
+                        f.flush()
+                if closing or time.monotonic() - last_sync >= self.fsync_interval:
+                    for f in files:
+                        os.fsync(f.fileno())
+                    last_sync = time.monotonic()
+            except Exception as e:
+                logger.error(f"写入结果日志出错：{e}")
+        for f in files:
+            f.close()
+
+    def close(self):
+        """
+        写入缓冲区中的全部记录并 fsync
+        """
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
@@ -3,10 +3,11 @@
 import time
 import traceback
 import os
-from threading import Thread
+import shutil
+from functools import partial
+from threading import Thread, BoundedSemaphore, Lock
 from dotenv import load_dotenv
 
-import requests
 from DrissionPage import ChromiumPage, ChromiumOptions
 from loguru import logger
 from pathlib import Path
@@ -14,10 +15,45 @@ from queue import Queue
 
 # 导入自定义工具函数
 from utils import (
-    write_failed_file,
     clean_filename,
     init_log_files,
-    generate_download_report
+    filter_request_headers,
+    cookies_to_dict,
+    is_file_node
+)
+from dentry_lister import DentryLister
+from http_client import get_http_client
+from downloader import download, PART_SUFFIX, SEGMENTS_SUFFIX
+from rate_limit import (
+    get_rate_limiter,
+    raise_for_throttle,
+    ENDPOINT_LIST,
+    ENDPOINT_DOWNLOAD,
+    ENDPOINT_EXPORT
+)
+from waits import PageWaiter, wait_stats
+from tree_locator import TreeIndex, TreeLocator
+from direct_download import resolver_from_env
+from aio_engine import AsyncIOEngine, httpx
+from export_monitor import ExportMonitor
+from scheduler import WorkScheduler, SpillQueue, parent_of
+from session import SessionBootstrap
+from dedup import ContentStore
+from report import generate_download_report
+from metrics import metrics, MetricsExporter
+from tracing import tracer
+from completion import CompletionTracker
+from journal import ResultJournal, KIND_DONE, KIND_FAILED, KIND_NO_RIGHT, KIND_SKIPPED, KIND_DELETED
+from browser_pool import BrowserPool, auto_pool_size, kill_process_tree
+from state_store import (
+    CrawlStateStore,
+    STATUS_LISTED,
+    STATUS_EXPORTED,
+    STATUS_DOWNLOADED,
+    STATUS_FAILED,
+    STATUS_NO_RIGHT,
+    STATUS_DELETED,
+    DEFAULT_VERSION_KEYS
 )
 
 # 加载.env配置文件
@@ -26,115 +62,364 @@ load_dotenv()
 proceed_node = set()
 proceed_files = set()
 
-req_queue = Queue()
-download_queue = Queue()
-
 # 配置项 - 从.env文件读取
+# 各阶段之间的队列有上限，下游处理不过来时上游等待（背压）；待处理节点超过 NODE_QUEUE_MEMORY 个后暂存到磁盘
+req_queue = Queue(maxsize=int(os.getenv("REQ_QUEUE_SIZE", "500")))
+download_queue = Queue(maxsize=int(os.getenv("DOWNLOAD_QUEUE_SIZE", "200")))
 # 公司ID
 corpId = os.getenv("CORP_ID", "")
 # 组织（库）ID
 target_orgid = os.getenv("TARGET_ORGID", "")
-# 无权限文件
-no_right_files = []  # 无权限文件
-failed_files = []     # 下载失败的文件
-skipped_files = []    # 跳过的文件
+# 处理结果（失败、无权限、跳过、上游删除）由单独的写线程写入 results.jsonl 及各文本日志
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", "results.jsonl")
+journal = ResultJournal(JOURNAL_FILE, buffer_size=int(os.getenv("JOURNAL_BUFFER_SIZE", "10000")),
+                        fsync_interval=float(os.getenv("JOURNAL_FSYNC_INTERVAL", "5")))
 loggined_done = False
+# 持久化抓取状态，重启后据此跳过已完成节点
+state_store = CrawlStateStore(os.getenv("STATE_DB", "crawl_state.db"),
+                              os.getenv("SYNC_VERSION_KEYS", DEFAULT_VERSION_KEYS))
+# 内容去重：相同内容的文件替换为硬链接（hardlink/reflink/off）
+content_store = ContentStore(state_store, os.getenv("DEDUP", "hardlink"))
+# 链接文件的 linkSourceInfo 中表示源节点的字段名
+LINK_SOURCE_KEYS = [x.strip() for x in os.getenv("LINK_SOURCE_KEYS", "dentryUuid,sourceDentryUuid").split(",") if x.strip()]
+# 同步方式：full 只跳过已完成的节点；incremental 重新展开所有文件夹，只导出新增和修改版本变化的文件，并检测上游删除
+SYNC_MODE = os.getenv("SYNC_MODE", "full")
+# 上游已删除的节点：flag 只记录，prune 同时删除本地文件
+SYNC_DELETED = os.getenv("SYNC_DELETED", "flag")
+# 目录遍历方式：browser 由浏览器点击展开文件夹；api 登录后直接请求 dentry/list 接口遍历，浏览器只负责导出
+LIST_MODE = os.getenv("LIST_MODE", "browser")
+dentry_lister = None
+# 子节点在父节点中的顺序，用于直接推算节点在目录树中的位置
+tree_index = TreeIndex()
+# 普通上传文件直接通过HTTP下载，不经过浏览器
+direct_resolver = resolver_from_env()
+# 直接下载失败的节点，之后改由浏览器处理
+direct_failed = set()
+# HTTP工作方式：asyncio 由一个事件循环线程处理全部二次请求和下载；threads 为每类任务固定5个线程
+IO_ENGINE = os.getenv("IO_ENGINE", "asyncio")
+io_engine = None
+# 浏览器调试端口起始值，每启动一个浏览器（包括回收重建）使用下一个端口
+BROWSER_BASE_PORT = int(os.getenv("BROWSER_BASE_PORT", "9330"))
+browser_serial = 0
+browser_serial_lock = Lock()
+browser_pool = None
+# 每个浏览器中的工作标签页数，大于1时多个工作线程共用一个浏览器进程和登录状态
+BROWSER_TABS = int(os.getenv("BROWSER_TABS", "1"))
+tab_hosts = {}
+# 工作浏览器默认无头运行；登录只在一个可见浏览器中进行一次，cookies 复制给所有工作浏览器
+HEADLESS = os.getenv("HEADLESS", "1") == "1"
+session_cookies = []
+# 浏览器触发导出后不等待下载完成，由监视线程跟踪；每个浏览器同时进行的导出下载数上限
+EXPORTS_PER_BROWSER = int(os.getenv("EXPORTS_PER_BROWSER", "3"))
+export_monitor = ExportMonitor(timeout=float(os.getenv("EXPORT_DOWNLOAD_TIMEOUT", "1800")))
+# 未完成下载留下的临时文件（HTTP续传文件、浏览器下载中的文件），不算作已有输出
+TEMP_SUFFIXES = (PART_SUFFIX, SEGMENTS_SUFFIX, ".crdownload", ".tmp")
+# 打开组织页面后等待根目录列表响应的最长时间（秒），超时后不再阻止完成判定
+ROOT_LIST_TIMEOUT = float(os.getenv("ROOT_LIST_TIMEOUT", "300"))
+# 单个节点在本次运行中失败（导出、下载）达到该次数后不再放回队列，避免反复重试导致无法结束
+MAX_NODE_ATTEMPTS = int(os.getenv("MAX_NODE_ATTEMPTS", "10"))
+# 完成判定：各阶段未完成的工作全部为0（持续 COMPLETION_SETTLE 秒）时结束，不再等待空闲超时
+completion = CompletionTracker(settle=float(os.getenv("COMPLETION_SETTLE", "3")))
+# 大文件分段下载：单个文件的并发连接数（1为不分段）及启用分段的文件大小阈值
+DOWNLOAD_SEGMENTS = int(os.getenv("DOWNLOAD_SEGMENTS", "4"))
+SEGMENT_THRESHOLD = int(float(os.getenv("SEGMENT_THRESHOLD_MB", "64")) * 1024 * 1024)
+
+
+def node_save_dir(node_info):
+    """
+    节点文件的保存目录：{组织ID}/{祖先路径}/{文件名（不含扩展名）}/
+    """
+    file_path = '\\'.join([clean_filename(x['name']) for x in node_info['ancestorList']])
+    path = Path(".").absolute().joinpath(target_orgid).joinpath(file_path)
+    os.makedirs(str(path.absolute()), exist_ok=True)
+    return path.joinpath(clean_filename(node_info['name'].rsplit(".", 1)[0]))
+
+
+def prepare_download(res):
+    """
+    解析下载任务，创建保存目录
+
+    Returns:
+        tuple: (节点信息, 下载地址, 请求头, cookies, 保存路径)
+    """
+    # save_name 为保存的文件名，为None时从下载地址中提取
+    node_info, url, headers, cookies, save_path, save_name = res
+    p = Path(save_path)
+    # 创建文件夹
+    os.makedirs(p.absolute(), exist_ok=True)
+    filename = save_name or str(url).split("?")[0].split("/")[-1]
+    # 安全地处理cookies和headers，过滤掉HTTP/2伪头部字段
+    return node_info, url, filter_request_headers(headers), cookies_to_dict(cookies), p.joinpath(filename).absolute()
+
+
+def node_fields(node_info):
+    """
+    结果日志中节点的附加字段：节点ID和所在目录（祖先路径）
+    """
+    folder = "/".join(x.get('name', '') for x in node_info.get('ancestorList') or [])
+    return {"uuid": node_info.get('dentryUuid'), "folder": folder}
+
+
+def record_done(node_info, output, elapsed, via):
+    """
+    在结果日志中记录一个完成的节点，包括保存的字节数和耗时，用于生成报告
+    """
+    output = Path(output)
+    try:
+        if output.is_dir():
+            size = sum(x.stat().st_size for x in output.iterdir() if x.is_file())
+        else:
+            size = output.stat().st_size
+    except OSError:
+        size = 0
+    name = node_info.get('name', '')
+    info = (name, name.rsplit(".", 1)[-1] if "." in name else "", str(output))
+    metrics.inc("bytes_total", size, via=via)
+    journal.record(KIND_DONE, info, bytes=size, duration=round(elapsed, 3) if elapsed is not None else None,
+                   via=via, **node_fields(node_info))
+
+
+def finish_download(node_info, url, save_path, download_success, elapsed=None):
+    if download_success:
+        state_store.mark(node_info['dentryUuid'], STATUS_DOWNLOADED, str(save_path))
+        content_store.submit(save_path)
+        record_done(node_info, save_path, elapsed, "download")
+        return
+    logger.error(f"下载文件{url}失败，推回节点到浏览器进行重试")
+    # 记录失败文件信息
+    if 'name' in node_info:
+        file_info = (node_info.get('name', ''), url, "下载失败")
+        journal.record(KIND_FAILED, file_info, **node_fields(node_info))
+    state_store.mark(node_info['dentryUuid'], STATUS_FAILED, add_attempt=True)
+    direct_failed.add(node_info['dentryUuid'])
+    # 允许浏览器重新处理该节点
+    proceed_files.discard(node_info['dentryUuid'])
+    requeue_failed(node_info)
+
 
+def requeue_failed(node_info):
+    """
+    失败的节点放回队列重试；本次运行失败次数达到 MAX_NODE_ATTEMPTS 后不再放回，保持失败状态，下次运行重新计数
+
+    Returns:
+        bool: 是否已放回队列
+    """
+    attempts = state_store.attempts(node_info['dentryUuid'])
+    if attempts >= MAX_NODE_ATTEMPTS:
+        logger.error(f"节点{node_info.get('name')}累计失败{attempts}次，本次运行不再重试")
+        failed_info = (node_info.get('name', ''), node_info.get('contentType', ''), f"累计失败{attempts}次，放弃重试")
+        journal.record(KIND_FAILED, failed_info, **node_fields(node_info))
+        return False
+    q.put(node_info)
+    return True
 
 
 def process_download():
     while True:
-        res = download_queue.get(block=True)
+        with tracer.span("queue_wait", "queue"):
+            res = download_queue.get(block=True)
         if not res:
+            download_queue.task_done()
             continue
         try:
-            node_info, url, headers, cookies, save_path, save_name = res
-            p = Path(save_path)
-            # 创建文件夹
-            os.makedirs(p.absolute(), exist_ok=True)
-            # 安全地处理cookies
-            if cookies:
-                if hasattr(cookies, '__iter__'):
-                    cookies = {x["name"]: x["value"] for x in cookies}
-                else:
-                    cookies = {}
-            else:
-                cookies = {}
-
+            node_info, url, headers, cookies, save_path = prepare_download(res)
             download_success = False
-            for retry_times in range(10):
-                try:
-                    # 安全地处理headers
-                    if headers:
-                        # 过滤掉HTTP/2伪头部字段
-                        filtered_headers = {k: v for k, v in headers.items()
-                                         if not k.startswith(':') and k.lower() not in ['host', 'connection']}
-                    else:
-                        filtered_headers = {}
-                    req = requests.request(method="get", url=url, headers=filtered_headers, cookies=cookies)
-                    filename = str(url).split("?")[0].split("/")[-1]
-                    save_path = p.joinpath(filename)
-                    if req.status_code == 200:
-                        with open(save_path.absolute(), "wb") as f:
-                            f.write(req.content)
-                        download_success = True
-                        break
-                    else:
-                        raise Exception(f"下载失败，返回状态码{req.status_code},内容：{req.content}")
-                except Exception as e:
-                    logger.error(f"下载文件{url} 重试{retry_times} 出错：{e}")
-                    time.sleep(5)
-                    continue
-            if not download_success:
-                logger.error(f"下载文件{url}失败，推回节点到浏览器进行重试")
-                # 记录失败文件信息
-                if 'name' in node_info:
-                    file_info = (node_info.get('name', ''), url, "下载失败")
-                    if file_info not in failed_files:
-                        failed_files.append(file_info)
-                        write_failed_file("failed_files.log", file_info)
-                q.put(node_info)
+            started = time.monotonic()
+            try:
+                # 流式写入临时文件，校验长度后再重命名，中断后从临时文件续传；大文件分段并发下载
+                with metrics.timer("http_download"):
+                    get_rate_limiter().call(ENDPOINT_DOWNLOAD, download, url, save_path,
+                                            headers=headers, cookies=cookies,
+                                            segments=DOWNLOAD_SEGMENTS, segment_threshold=SEGMENT_THRESHOLD,
+                                            desc=f"下载文件{url}")
+                download_success = True
+            except Exception:
+                # 每次失败的原因已由限流器记录到日志
+                pass
+            finish_download(node_info, url, save_path, download_success, time.monotonic() - started)
         except Exception as e:
             logger.error(f"下载{res}出错 {e}：{traceback.format_exc()}")
+        finally:
+            # 失败推回浏览器的节点已入队后才标记完成
+            download_queue.task_done()
+
+
+async def process_download_async(res):
+    if not res:
+        return
+    try:
+        node_info, url, headers, cookies, save_path = prepare_download(res)
+        download_success = False
+        started = time.monotonic()
+        try:
+            with metrics.timer("http_download"):
+                await io_engine.call(ENDPOINT_DOWNLOAD, io_engine.download, url, save_path,
+                                     headers=headers, cookies=cookies,
+                                     segments=DOWNLOAD_SEGMENTS, segment_threshold=SEGMENT_THRESHOLD,
+                                     desc=f"下载文件{url}")
+            download_success = True
+        except Exception:
+            pass
+        finish_download(node_info, url, save_path, download_success, time.monotonic() - started)
+    except Exception as e:
+        logger.error(f"下载{res}出错 {e}：{traceback.format_exc()}")
+
+
+def fetch_dentry_list(url, headers, cookies):
+    req = get_http_client().get(url, headers=headers, cookies=cookies)
+    raise_for_throttle(req)
+    return req.json()["data"]
+
+
+def prepare_repeat(res):
+    """
+    解析浏览器抓到但没有响应体的 dentry/list 请求，返回 (请求地址, 请求头, cookies)，不需要重放时返回None
+    """
+    if not res:
+        return None
+    if "/dentry/list?" not in str(res.url):
+        logger.info(f"跳过{str(res.url)}")
+        return None
+    logger.info(f"二次请求{res.url}，待请求长度：{req_queue.qsize()}")
+    # 安全地获取cookies和headers
+    cookies = cookies_to_dict(getattr(res.request, 'cookies', None))
+    # 过滤掉HTTP/2伪头部字段
+    filtered_headers = filter_request_headers(getattr(res.request, 'headers', None))
+    return res.url, filtered_headers, cookies
+
+
+def finish_repeat(q, url, data):
+    if data:
+        logger.info(f"二次请求完成，待请求长度：{req_queue.qsize()}")
+        with metrics.timer("list_process"):
+            process_req(q, data)
+    else:
+        logger.error(f"二次请求{url} 失败次数超过限制，放弃")
+
 
 def request_repeater(q):
     while True:
-        res = req_queue.get(block=True)
-        data = None
-        if res:
-            if "/dentry/list?" not in str(res.url):
-                logger.info(f"跳过{str(res.url)}")
+        with tracer.span("queue_wait", "queue"):
+            res = req_queue.get(block=True)
+        try:
+            request = prepare_repeat(res)
+            if not request:
                 continue
-            for _ in range(10):
-                try:
-                    logger.info(f"二次请求{res.url}，待请求长度：{req_queue.qsize()}")
-                    # 安全地获取cookies和headers
-                    cookies = {}
-                    if hasattr(res.request, 'cookies') and res.request.cookies:
-                        if hasattr(res.request.cookies, '__iter__'):
-                            cookies = {x["name"]: x["value"] for x in res.request.cookies}
-
-                    headers = {}
-                    if hasattr(res.request, 'headers') and res.request.headers:
-                        headers = res.request.headers
-
-                    # 过滤掉HTTP/2伪头部字段
-                    filtered_headers = {k: v for k, v in headers.items()
-                                     if not k.startswith(':') and k.lower() not in ['host', 'connection']}
-
-                    data = requests.request(method="get", url=res.url, headers=filtered_headers,
-                                            cookies=cookies)
-                    data = data.json()["data"]
-                    logger.info(f"二次请求完成，待请求长度：{req_queue.qsize()}")
-                    break
-                except Exception as e:
-                    logger.error(f"二次请求{res.url} 出错：{e}")
-                    time.sleep(5)
-                    continue
-            if data:
-                process_req(q, data)
+            url, headers, cookies = request
+            try:
+                with metrics.timer("list_replay"):
+                    data = get_rate_limiter().call(ENDPOINT_LIST, fetch_dentry_list, url, headers, cookies,
+                                                   desc=f"二次请求{url}")
+            except Exception:
+                data = None
+            finish_repeat(q, url, data)
+        finally:
+            req_queue.task_done()
+
+
+async def request_repeater_async(res):
+    request = prepare_repeat(res)
+    if not request:
+        return
+    url, headers, cookies = request
+    try:
+        with metrics.timer("list_replay"):
+            data = await io_engine.call(ENDPOINT_LIST, io_engine.fetch_json, url, headers, cookies,
+                                        desc=f"二次请求{url}")
+    except Exception:
+        data = None
+    finish_repeat(q, url, data)
+
+
+def export_done(node_info, fname, headers, cookies, mission, timed_out=False, elapsed=None):
+    """
+    浏览器下载任务结束后的处理：成功时记录状态，失败时交给HTTP下载线程重新下载
+    """
+    if elapsed is not None:
+        metrics.observe("stage_seconds", elapsed, stage="export_download")
+        tracer.complete("export_download", "stage", time.perf_counter() - elapsed, elapsed, file=fname.name)
+    if mission.final_path or mission.state == "skipped":
+        state_store.mark(node_info['dentryUuid'], STATUS_EXPORTED, str(fname.absolute()))
+        content_store.submit(mission.final_path)
+        record_done(node_info, fname, elapsed, "export")
+        logger.info(f"下载{fname}完成")
+        return
+    logger.info(f"下载{fname} 任务失败 任务最终状态：{'超时' if timed_out else mission.state}")
+    if "blob" not in mission.url:
+        res = (node_info, mission.url, headers, cookies, str(fname.absolute()), None)
+        download_queue.put(res)
+        logger.info(f"生成下载{fname}任务")
+    else:
+        # blob 地址无法在浏览器外下载，记录失败，下次运行时重新导出
+        state_store.mark(node_info['dentryUuid'], STATUS_FAILED, add_attempt=True)
+
+
+def report_stats(interval):
+    while True:
+        time.sleep(interval)
+        get_http_client().log_stats()
+        wait_stats.log_summary()
+        q.log_summary()
+        content_store.log_summary()
+        if browser_pool:
+            browser_pool.log_summary()
+        logger.info(f"进行中的导出下载：{export_monitor.pending()} 已完成：{export_monitor.completed} "
+                    f"失败：{export_monitor.failed}")
+
+
+def has_output(node_uuid, fname):
+    """
+    节点的保存目录中是否已有文件（不包括未完成下载的续传文件）；增量同步中内容有更新的节点先删除旧文件，返回False
+    """
+    if not (fname.exists() and fname.is_dir()):
+        return False
+    if state_store.is_changed(node_uuid):
+        logger.info(f"{fname} 内容有更新，删除旧文件后重新导出")
+        shutil.rmtree(fname, ignore_errors=True)
+        return False
+    return any(not name.endswith(TEMP_SUFFIXES) for name in os.listdir(fname))
+
+
+def link_from_source(node_info):
+    """
+    链接文件（dlink）的源文件已经下载过时，直接链接到链接文件的保存目录，不再打开页面导出
+
+    Returns:
+        bool: 是否已处理
+    """
+    if not node_info['name'].endswith(".dlink"):
+        return False
+    source_info = node_info.get('linkSourceInfo') or {}
+    source_uuid = next((source_info[key] for key in LINK_SOURCE_KEYS if source_info.get(key)), None)
+    output = state_store.output_of(source_uuid) if source_uuid else None
+    if not output:
+        return False
+    fname = node_save_dir(node_info)
+    if not content_store.link_into(output, fname):
+        return False
+    state_store.mark(node_info['dentryUuid'], STATUS_EXPORTED, str(fname.absolute()))
+    record_done(node_info, fname, None, "link")
+    logger.info(f"链接文件{node_info['name']}的源文件已下载，直接链接到{fname}")
+    return True
+
+
+def handle_deleted():
+    """
+    增量同步结束后处理上游已删除的节点：记录到 deleted_files.log，SYNC_DELETED=prune 时同时删除本地文件
+    """
+    rows = state_store.find_deleted()
+    if rows is None:
+        return
+    for node_uuid, name, output_path in rows:
+        state_store.mark(node_uuid, STATUS_DELETED)
+        journal.record(KIND_DELETED, (name, node_uuid, output_path or ""))
+        if SYNC_DELETED == "prune" and output_path and os.path.exists(output_path):
+            if os.path.isdir(output_path):
+                shutil.rmtree(output_path, ignore_errors=True)
             else:
-                logger.error(f"二次请求{res.url} 失败次数超过10，放弃")
+                os.remove(output_path)
+    logger.info(f"增量同步：上游已删除{len(rows)}个节点，"
+                f"{'已删除本地文件' if SYNC_DELETED == 'prune' else '已记录到 deleted_files.log'}")
 
 
 def process_req(q, data):
@@ -143,89 +428,256 @@ def process_req(q, data):
     if "children" in data:
         process_node_name = data['name']
         item_list = data["children"]
+        tree_index.record_children(item_list)
         added_names = []
         for node_info in item_list:
             node_name = node_info['name']
             node_uuid = node_info['dentryUuid']
+            if SYNC_MODE == "incremental":
+                # 增量同步：每个节点都要记录本次见过；未变化的文件直接跳过
+                if not state_store.observe(node_info):
+                    proceed_node.add(node_uuid)
+                    continue
             if node_uuid not in proceed_node:
                 added_names.append(node_name)
-                q.put(node_info)
+                if SYNC_MODE != "incremental":
+                    state_store.record_discovered(node_info)
+                if dentry_lister and not is_file_node(node_info):
+                    # 接口遍历模式下文件夹不经过浏览器
+                    dentry_lister.submit(node_info)
+                else:
+                    q.put(node_info)
                 proceed_node.add(node_uuid)
+        # 子节点已全部记录，文件夹视为展开完成
+        if data.get('dentryUuid'):
+            state_store.mark(data['dentryUuid'], STATUS_LISTED)
         if added_names:
             logger.info(f"队列长度：{q.qsize()} 从【{process_node_name}】 添加子节点{len(added_names)}个：{', '.join(added_names)}")
 
+
+def launch_browser(profile_index, headless=None):
+    """
+    启动一个浏览器，每次使用新的调试端口，避免被回收浏览器的线程连接到新浏览器；
+    工作浏览器启动后写入登录会话的cookies
+
+    Args:
+        profile_index: 用户数据目录编号
+        headless: 是否无头运行，默认按 HEADLESS 配置
+    """
+    global browser_serial
+    with browser_serial_lock:
+        browser_serial += 1
+        port = BROWSER_BASE_PORT + browser_serial - 1
+    options = ChromiumOptions().set_local_port(port).set_user_data_path(f'data{profile_index}')
+    page = ChromiumPage(options.headless(HEADLESS if headless is None else headless))
+    if session_cookies and headless is None:
+        page.set.cookies(session_cookies)
+    return page
+
+
+def tab_host(host_index):
+    """
+    多标签页模式下获取编号对应的共享浏览器，浏览器已退出时重新启动
+    """
+    with browser_serial_lock:
+        host = tab_hosts.get(host_index)
+    try:
+        if host and host.states.is_alive:
+            return host
+    except Exception:
+        pass
+    host = launch_browser(host_index)
+    with browser_serial_lock:
+        tab_hosts[host_index] = host
+    return host
+
+
+def close_tab_hosts():
+    """
+    关闭多标签页模式下共用的浏览器（工作线程退出时只关闭自己的标签页）
+    """
+    with browser_serial_lock:
+        hosts = list(tab_hosts.values())
+        tab_hosts.clear()
+    for host in hosts:
+        try:
+            host.quit()
+        except Exception:
+            pass
+
+
+def new_processer(index):
+    """
+    浏览器池创建工作线程：每个工作线程独占一个浏览器，或多标签页模式下每 BROWSER_TABS 个工作线程共用一个浏览器
+    """
+    if BROWSER_TABS > 1:
+        host = tab_host(index // BROWSER_TABS)
+        return Processer(q, index, host.new_tab(), host)
+    return Processer(q, index, launch_browser(index))
+
+
+def requeue_lost(node_info):
+    """
+    被回收的浏览器正在处理的节点放回队列
+    """
+    proceed_files.discard(node_info['dentryUuid'])
+    if not state_store.is_done(node_info['dentryUuid']):
+        # 卡住浏览器的节点同样计入失败次数，避免反复回收
+        state_store.mark(node_info['dentryUuid'], STATUS_FAILED, add_attempt=True)
+        requeue_failed(node_info)
+    # 被回收的浏览器不会再标记该节点完成
+    q.task_done(node_info)
+
+
 class Processer:
 
-    def __init__(self, q, index=0):
+    def __init__(self, q, index=0, page=None, host=None):
+        """
+        Args:
+            page: 使用的页面，默认启动一个独立的浏览器
+            host: 多标签页模式下页面所属的浏览器，None 表示独占浏览器
+        """
         self.idx = index
         self.q = q
-        self.page = ChromiumPage(ChromiumOptions().set_local_port(int(f"933{index}")).set_user_data_path(f'data{index}'))
+        self.host = host
+        self.page = page or ChromiumPage(ChromiumOptions().set_local_port(BROWSER_BASE_PORT + index)
+                                         .set_user_data_path(f'data{index}'))
         package_urls = ['box/api/v2/dentry/list?']
         self.page.listen.start(package_urls, res_type=True)
+        self.waiter = PageWaiter(self.page, index)
+        # 本浏览器同时进行的导出下载名额
+        self.export_slots = BoundedSemaphore(EXPORTS_PER_BROWSER)
+        self.locator = TreeLocator(self.page, tree_index, index)
         self.page.get(f'https://alidocs.dingtalk.com/i/desktop/spaces/?corpId={corpId}')
         self.inited = False
+        # 打开组织页面后等待根目录列表响应的截止时间
+        self.root_deadline = None
+        # 上一个处理的节点，下一个节点是它的兄弟或子节点时目录树已停留在该处，不需要重新打开页面
+        self.last_node = None
         self.headers = {}
         self.cookies = {}
+        # 供浏览器池检查：stop 置为True后处理完当前节点退出，finished 为正常退出，current/busy_since 为正在处理的节点
+        self.stop = False
+        self.finished = False
+        self.current = None
+        self.busy_since = None
+        self.processed = 0
+
+    def browser_pid(self):
+        try:
+            return (self.host or self.page).process_id
+        except Exception:
+            return None
+
+    def kill(self):
+        """
+        强制结束：多标签页模式下只关闭本标签页，不影响同一浏览器中的其他标签页
+        """
+        if self.host:
+            self.host.close_tabs(self.page.tab_id)
+        else:
+            kill_process_tree(self.browser_pid())
+
+    def drain_listener(self):
+        """
+        处理浏览器已抓到的 dentry/list 响应：子节点入队，没有响应体的请求交给二次请求
+        """
+        while self.page.listen._caught.qsize():
+            res = self.page.listen.wait(timeout=5)
+            if res:
+                if res.response and res.response.body and res.response.body.get("data"):
+                    data = res.response.body["data"]
+                    process_req(self.q, data)
+                    get_rate_limiter().record_success()
+                    try:
+                        # 更新最新header以及cookies
+                        if hasattr(res, 'request') and res.request:
+                            self.headers = getattr(res.request, 'headers', {})
+                            self.cookies = getattr(res.request, 'cookies', {})
+                            if dentry_lister:
+                                dentry_lister.set_template(res.url, self.headers, self.cookies)
+                    except Exception:
+                        pass
+
+                else:
+                    # 确保res对象有效才放入队列
+                    if res and hasattr(res, 'url') and res.url:
+                        req_queue.put(res)
+                # 第一个列表响应（根目录）的子节点或二次请求已入队，之后由各阶段的计数判定完成
+                completion.release("root")
 
     def run(self):
-        empty_count = 0
-        while True:
+        while not self.stop:
             if loggined_done and not self.inited:
                 self.inited = True
                 # 打开组织页面
                 self.page.get(f'https://alidocs.dingtalk.com/i/spaces/{target_orgid}/overview?corpId={corpId}')
+                self.root_deadline = time.monotonic() + ROOT_LIST_TIMEOUT
             self.block_wait()
-            while self.page.listen._caught.qsize():
-                res = self.page.listen.wait(timeout=5)
-                if res:
-                    if res.response and res.response.body and res.response.body.get("data"):
-                        data = res.response.body["data"]
-                        process_req(self.q, data)
+            self.drain_listener()
+
+            item = self.q.get(self.idx)
+            if item is not None:
+                self.current, self.busy_since = item, time.monotonic()
+                try:
+                    for retry in range(4):
                         try:
-                            # 更新最新header以及cookies
-                            if hasattr(res, 'request') and res.request:
-                                self.headers = getattr(res.request, 'headers', {})
-                                self.cookies = getattr(res.request, 'cookies', {})
-                        except Exception:
-                            pass
+                            with metrics.timer("node", kind="file" if is_file_node(item) else "folder"):
+                                self.process_node(item, load_page=retry > 0 or not self.tree_nearby(item))
+                            break
+                        except Exception as e:
+                            logger.error(f"处理{item}时发生错误：{e} 重试{retry+1}")
+                    # 展开文件夹抓到的子节点入队后，该节点才算处理完
+                    self.drain_listener()
+                finally:
+                    # 被浏览器池回收时 current 已清空，节点由 requeue_lost 放回队列并标记
+                    if self.current is not None:
+                        self.q.task_done(item)
+                    self.current = self.busy_since = None
+                self.processed += 1
+                continue
 
-                    else:
-                        # 确保res对象有效才放入队列
-                        if res and hasattr(res, 'url') and res.url:
-                            req_queue.put(res)
+            if self.root_deadline and time.monotonic() > self.root_deadline:
+                self.root_deadline = None
+                if completion.release("root"):
+                    logger.warning(f"[{self.idx}] {ROOT_LIST_TIMEOUT:.0f}秒内没有抓到根目录的列表请求，不再等待")
+            # 队列暂时为空时其他阶段可能还会产生节点，由主线程判定全部完成后通知退出
+            with tracer.span("idle", "queue", idx=self.idx):
+                time.sleep(1)
 
-            if not self.q.empty():
-                item = self.q.get()
-                for retry in range(4):
-                    try:
-                        self.process_node(item)
-                        break
-                    except Exception as e:
-                        logger.error(f"处理{item}时发生错误：{e} 重试{retry+1}")
-                empty_count = 0
-                continue
+        logger.info(f"[{self.idx}] 退出")
+        self.finished = True
 
-            if empty_count > 30:
-                logger.info(f"[{self.idx}] 退出")
-                break
-            empty_count += 1
-            time.sleep(5)
+        try:
+            self.page.close()
+            if not self.host:
+                self.page.browser.quit()
+        except Exception:
+            # 被浏览器池回收的浏览器进程已经结束
+            pass
 
-        self.page.close()
-        self.page.browser.quit()
+    def tree_nearby(self, node_info):
+        """
+        节点是否为上一个节点的兄弟或子节点（目录树中已展开、就在附近）
+        """
+        if not self.last_node or "/i/nodes/" not in str(self.page.url):
+            return False
+        parent = parent_of(node_info)
+        return parent in (parent_of(self.last_node), self.last_node['dentryUuid'])
 
     def block_wait(self):
-        time.sleep(1)
-        while not self.page.listen.wait_silent(targets_only=True):
-            time.sleep(1)
+        self.waiter.network_idle()
 
     def process_node(self, node_info, load_page=True):
         node_name = node_info['name']
         node_uuid = node_info['dentryUuid']
         ancestorList = node_info['ancestorList']
-        # if node_uuid in proceed_node:
-        #     logger.info(f"[{self.idx}]jump{node_uuid}")
-        #     return
+        # 上次运行已完成的节点直接跳过，不再打开页面
+        if state_store.is_done(node_uuid):
+            logger.info(f"[{self.idx}] 节点{node_name}已完成，跳过")
+            return
+        if is_file_node(node_info) and (link_from_source(node_info) or self.direct_download(node_info)):
+            return
 
         parent_node_name = "根节点"
         if ancestorList:
@@ -233,19 +685,20 @@ class Processer:
         logger.info(f"[{self.idx}] 开始处理节点:{node_name} 父节点：{parent_node_name}")
         # 直接跳转页面
         if load_page:
-            self.page.get(f"https://alidocs.dingtalk.com/i/nodes/{node_uuid}")
+            with metrics.timer("page_get"):
+                self.page.get(f"https://alidocs.dingtalk.com/i/nodes/{node_uuid}")
+        self.last_node = node_info
         self.block_wait()
         # 判断是否页面白屏
-        if node_info.get('contentType') == 'alidoc' or node_info.get('dentryType') == 'file':
+        if is_file_node(node_info):
             logger.info(f"[{self.idx}] {node_name}是文件，继续处理")
             success = self.process_file(node_info)
-            if not success:
+            if not success and requeue_failed(node_info):
                 logger.info(f"[{self.idx}] {node_name} 文件 处理失败，推回队列 后续重试")
-                self.q.put(node_info)
             # 选中节点
             find_div = f"@data-rbd-draggable-id={node_uuid}"
             try:
-                item = self.scroll_to_see(find_div)
+                item = self.find_row(node_info, find_div)
                 self.to_item(item)
             except Exception as e:
                 logger.info(f"[{self.idx}] {find_div}: {e} {traceback.format_exc()}")
@@ -255,16 +708,46 @@ class Processer:
             # 选中节点
             find_div = f"@data-rbd-draggable-id={node_uuid}"
             try:
-                button = self.scroll_to_see(find_div)
+                button = self.find_row(node_info, find_div)
                 if not button:
                     self.process_node(node_info)
-                time.sleep(0.5)
                 self.to_item(button)
+                button.wait.clickable()
                 button.click()
-                time.sleep(0.5)
+                # 等待展开文件夹触发的 dentry/list 请求完成
+                self.waiter.network_idle("folder_expand")
             except Exception as e:
                 logger.info(f"[{self.idx}] {find_div}: {e} {traceback.format_exc()}")
                 self.process_node(node_info, load_page=False)
+    def direct_download(self, node_info):
+        """
+        普通上传文件直接解析下载地址交给下载线程，不打开页面
+
+        Returns:
+            bool: 是否已交给下载线程
+        """
+        node_uuid = node_info['dentryUuid']
+        if not direct_resolver.enabled or not self.cookies or node_uuid in direct_failed:
+            return False
+        if not direct_resolver.is_native_file(node_info) or node_uuid in proceed_files:
+            return False
+        with metrics.timer("direct_resolve"):
+            url = direct_resolver.resolve(node_info, filter_request_headers(self.headers),
+                                          cookies_to_dict(self.cookies))
+        if not url:
+            direct_failed.add(node_uuid)
+            return False
+        fname = node_save_dir(node_info)
+        if has_output(node_uuid, fname):
+            logger.info(f"[{self.idx}] 节点已完成下载：{fname} 跳过。")
+            state_store.mark(node_uuid, STATUS_EXPORTED, str(fname.absolute()))
+            return True
+        proceed_files.add(node_uuid)
+        download_queue.put((node_info, url, self.headers, self.cookies, str(fname.absolute()),
+                            clean_filename(node_info['name'])))
+        logger.info(f"[{self.idx}] 直接下载{node_info['name']}，不经过浏览器")
+        return True
+
     def to_item(self, item):
         # Get element position using DrissionPage's methods
         # ElementRect has location property which is a tuple (x, y)
@@ -279,17 +762,26 @@ class Processer:
                 has_limit[0].click()
                 break
 
+    def find_row(self, node_info, loc):
+        """
+        先按子节点顺序推算位置直接跳转，找不到再从头逐屏滚动查找
+        """
+        try:
+            with metrics.timer("tree_locate"):
+                item = self.locator.locate(node_info, loc)
+            if item:
+                return item
+        except Exception as e:
+            logger.info(f"[{self.idx}] 推算定位{loc}出错：{e}")
+        with metrics.timer("tree_scroll"):
+            return self.scroll_to_see(loc)
+
     def scroll_to_see(self, loc,retry_times=0):
         if retry_times > 5:
             return
         try:
-            # 先尝试直接找
-            client_now = self.page.run_js(
-                'return document.getElementsByClassName("MAINSITE_CATALOG-node-tree-list")[0].scrollTop')
-            client_height = self.page.run_js(
-                'return document.getElementsByClassName("MAINSITE_CATALOG-node-tree-list")[0].clientHeight')
-            tree = self.page.ele(".:MAINSITE_CATALOG-node-tree-list")
-            item = self.scroll(tree, client_now, client_height, loc)
+            # 从当前位置开始向下逐屏查找
+            item = self.scroll(loc)
             if item:
                 return item
             else:
@@ -298,34 +790,29 @@ class Processer:
             logger.error(f"滚动时出错：{e}，等待重试")
             return self.scroll_to_see(loc,retry_times+1)
 
-    def scroll(self, tree, start, client_height, loc):
-        if start == 0:
-            tree.scroll.to_top()
-            tree.scroll.to_location(0, 0)
-            time.sleep(0.5)
-        item = self.page.ele(loc, timeout=2)
-        if item:
-            return item
-        last_scrollTop = None
-        start_height = int(start)
-        to_height = self.page.run_js(
-            'return document.getElementsByClassName("MAINSITE_CATALOG-node-tree-list")[0].scrollHeight')
-        # 每次滚动的高度
-        roll_height = 300
-        while start_height < to_height:
-            to_height = self.page.run_js(
-                'return document.getElementsByClassName("MAINSITE_CATALOG-node-tree-list")[0].scrollHeight')
-            if last_scrollTop is not None and last_scrollTop == to_height and (
-                    start_height > (to_height / 2)):
-                return self.scroll(tree, 0, client_height, loc)
-            last_scrollTop = self.page.run_js(
-                'return document.getElementsByClassName("MAINSITE_CATALOG-node-tree-list")[0].scrollTop')
-            logger.info(f"[{self.idx}] 正在滚动【高度信息：当前：{last_scrollTop or 0}->目标：{start_height}/整体{to_height}】")
+    def scroll(self, loc, start=None):
+        # 每一步只调用一次页面探测脚本：滚动、等待渲染、查找目标行、读取滚动信息
+        row_id = loc.split("=", 1)[-1]
+        state = self.locator.probe(row_id, scroll_to=start)
+        if not state.get('tree'):
+            return None
+        if state['found']:
+            return self.page.ele(loc, timeout=2)
+        start_height = int(state['scrollTop'])
+        # 每次滚动不超过可视高度，保证每一行都会被渲染到
+        roll_height = max(300, int(state['clientHeight'] * 0.8))
+        while True:
+            logger.info(f"[{self.idx}] 正在滚动【高度信息：当前：{state['scrollTop']}->目标：{start_height + roll_height}"
+                        f"/整体{state['scrollHeight']}】")
             start_height += roll_height
-            tree.scroll.to_location(0, start_height)
-            item = self.page.ele(loc, timeout=3)
-            if item:
-                return item
+            state = self.locator.probe(row_id, scroll_to=start_height)
+            if state['found']:
+                return self.page.ele(loc, timeout=2)
+            if state['scrollTop'] + state['clientHeight'] >= state['scrollHeight']:
+                # 已滚动到底部，若不是从顶部开始找的则回到顶部再找一遍
+                if start != 0:
+                    return self.scroll(loc, 0)
+                return None
 
     def process_file(self, node_info, retry_times=0):
         node_name = node_info['name']
@@ -339,13 +826,10 @@ class Processer:
         file_path = '\\'.join([clean_filename(x) for x in ancestor_path])
         node_name = clean_filename(node_name.rsplit(".", 1)[0])
         logger.info(f"[{self.idx}] 处理文件:{node_name} 路径：{file_path} 文件类型：{file_type}")
-        path = Path(".").absolute()
-        path = path.joinpath(target_orgid)
-        path = path.joinpath(file_path)
-        os.makedirs(str(path.absolute()), exist_ok=True)
-        fname = path.joinpath(node_name)
-        if fname.exists() and fname.is_dir() and len(list(os.listdir(fname))) > 0:
+        fname = node_save_dir(node_info)
+        if has_output(node_uuid, fname):
             logger.info(f"[{self.idx}] 节点已完成下载：{fname} 跳过。")
+            state_store.mark(node_uuid, STATUS_EXPORTED, str(fname.absolute()))
             return True
         if retry_times > 2:
             self.page.refresh()
@@ -353,16 +837,15 @@ class Processer:
             logger.error(f"请求节点：{node_name}，{ancestor_path}出错次数超过10次，放弃")
             no_right_info = (file_path, node_name, file_type)
             failed_info = (node_name, file_type, f"重试次数超过限制（{retry_times}次）")
-            no_right_files.append(no_right_info)
-            failed_files.append(failed_info)
-            write_failed_file("no_right_files.log", no_right_info)
-            write_failed_file("failed_files.log", failed_info)
+            journal.record(KIND_NO_RIGHT, no_right_info, **node_fields(node_info))
+            journal.record(KIND_FAILED, failed_info, **node_fields(node_info))
+            state_store.mark(node_uuid, STATUS_FAILED, str(fname.absolute()), add_attempt=True)
             proceed_files.remove(node_uuid)
             return
         # 选中节点
         find_div = f"@data-rbd-draggable-id={node_uuid}"
         try:
-            item = self.scroll_to_see(find_div)
+            item = self.find_row(node_info, find_div)
             self.to_item(item)
             item.click()
         except Exception as e:
@@ -373,8 +856,8 @@ class Processer:
         for ne in notice_eles:
             if "暂无权限访问" in str(ne.text):
                 no_right_info = (file_path, node_name, file_type)
-                no_right_files.append(no_right_info)
-                write_failed_file("no_right_files.log", no_right_info)
+                journal.record(KIND_NO_RIGHT, no_right_info, **node_fields(node_info))
+                state_store.mark(node_uuid, STATUS_NO_RIGHT, str(fname.absolute()))
                 logger.info(f"[{self.idx}] 节点：{node_name} 无访问权限，跳过")
                 return True
 
@@ -385,8 +868,20 @@ class Processer:
         self.page.set.download_path(str(fname.absolute()))
         self.page.set.download_file_name(node_name)
         self.page.set.when_download_file_exists("skip")
-        time.sleep(5)
+        # 进行中的导出下载达到上限时等待其中一个完成
+        with metrics.timer("export_slot_wait"):
+            self.export_slots.acquire()
+        tracked = False
+        retry = False
+        # 从等待页面就绪到下载任务开始（菜单点击、导出对话框等）
+        export_started = time.perf_counter()
+        # 导出名额在 finally 中归还，之后出错的步骤都要放在 try 内
         try:
+            # 浏览器导出同样受全局限流和熔断控制
+            with metrics.timer("rate_limit_wait", endpoint=ENDPOINT_EXPORT):
+                get_rate_limiter().acquire(ENDPOINT_EXPORT)
+            export_started = time.perf_counter()
+            self.waiter.page_ready()
             download_task = False
             last_err = None
             if "adoc" in file_type:
@@ -395,16 +890,15 @@ class Processer:
                     for i in range(5):
                         try:
                             limited_toolbar[0].click()
-                            time.sleep(0.5)
-                            self.page.ele("@data-item-key=export").click()
-                            self.page.ele("@data-item-key=exportAsWord").click()
+                            self.waiter.click("@data-item-key=export", "export_menu")
+                            self.waiter.click("@data-item-key=exportAsWord", "export_word")
                             self.check_alert()
-                            download_task = self.page.wait.download_begin(timeout=120)
+                            download_task = self.waiter.download_begin()
                             last_err = None
                             break
                         except Exception as err: 
                             last_err = err
-                            time.sleep(3)
+                            get_rate_limiter().retry_wait(i, err)
                             continue
                 else:
                     for i in range(5):
@@ -413,40 +907,36 @@ class Processer:
                             if normal_toolbar:
                                 normal_toolbar[0].click()
                                 self.page.ele("@data-testid=bi-toolbar-menu").click()
-                                time.sleep(0.5)
-                                self.page.ele("@data-testid=menu-item-J_file").click()
-                                time.sleep(0.5)
-                                self.page.ele("@data-testid=menu-item-J_fileExport").click()
-                                time.sleep(0.5)
-                                self.page.ele("@data-testid=menu-item-J_exportAsWord").ele("text:Word").click()
+                                self.waiter.click("@data-testid=menu-item-J_file", "file_menu")
+                                self.waiter.click("@data-testid=menu-item-J_fileExport", "export_menu")
+                                self.waiter.click("text:Word", "export_word",
+                                                  owner=self.page.ele("@data-testid=menu-item-J_exportAsWord"))
                                 self.check_alert()
-                                download_task = self.page.wait.download_begin(timeout=120)
+                                download_task = self.waiter.download_begin()
                                 last_err = None
                                 break
                         except Exception as err: 
                             last_err = err
-                            time.sleep(3)
+                            get_rate_limiter().retry_wait(i, err)
                             continue
                     else:
                         no_right_info = (file_path, node_name, file_type)
-                no_right_files.append(no_right_info)
-                write_failed_file("no_right_files.log", no_right_info)
+                        journal.record(KIND_NO_RIGHT, no_right_info, **node_fields(node_info))
             elif "axls" in file_type:
                 limited_toolbar = self.page.eles("@data-testid=doc-header-more-button", timeout=2)
                 if limited_toolbar:
                     for i in range(5):
                         try:
                             limited_toolbar[0].click()
-                            time.sleep(0.5)
-                            self.page.ele("@data-item-key=DOWNLOAD_AS").click()
-                            self.page.ele("@data-item-key=EXCEL").click()
+                            self.waiter.click("@data-item-key=DOWNLOAD_AS", "download_as_menu")
+                            self.waiter.click("@data-item-key=EXCEL", "export_excel")
                             self.check_alert()
-                            download_task = self.page.wait.download_begin(timeout=120)
+                            download_task = self.waiter.download_begin()
                             last_err = None
                             break
                         except Exception as err: 
                             last_err = err
-                            time.sleep(3)
+                            get_rate_limiter().retry_wait(i, err)
                             continue
                 else:
                     for i in range(5):
@@ -455,18 +945,18 @@ class Processer:
                             if normal_toolbar:
                                 normal_toolbar[0].ele(
                                     "@data-testid=submenu-menubar-table").ele("text:表格").click()
-                                time.sleep(0.5)
-                                self.page.ele("#wiki-new-sheet-iframe").ele(
-                                    "@data-testid=submenu-export-excel").ele("text:下载为").click()
-                                time.sleep(0.5)
-                                self.page.ele("#wiki-new-sheet-iframe").ele("text:Excel").click()
+                                self.waiter.click("text:下载为", "download_as_menu",
+                                                  owner=self.page.ele("#wiki-new-sheet-iframe").ele(
+                                                      "@data-testid=submenu-export-excel"))
+                                self.waiter.click("text:Excel", "export_excel",
+                                                  owner=self.page.ele("#wiki-new-sheet-iframe"))
                                 self.check_alert()
-                                download_task = self.page.wait.download_begin(timeout=120)
+                                download_task = self.waiter.download_begin()
                                 last_err = None
                                 break
                         except Exception as err: 
                             last_err = err
-                            time.sleep(3)
+                            get_rate_limiter().retry_wait(i, err)
                             continue
                     else:
                         for i in range(5):
@@ -475,16 +965,15 @@ class Processer:
                                 if download_button:
                                     download_button[0].click()
                                     self.check_alert()
-                                    download_task = self.page.wait.download_begin(timeout=120)
+                                    download_task = self.waiter.download_begin()
                                     last_err = None
                                     break
                                 else:
                                     no_right_info = (file_path, node_name, file_type)
-                                    no_right_files.append(no_right_info)
-                                    write_failed_file("no_right_files.log", no_right_info)
+                                    journal.record(KIND_NO_RIGHT, no_right_info, **node_fields(node_info))
                             except Exception as err:
                                 last_err = err
-                                time.sleep(3)
+                                get_rate_limiter().retry_wait(i, err)
                                 continue
 
             elif "pptx" in file_type or "ppt" in file_type:
@@ -496,18 +985,17 @@ class Processer:
                     for i in range(5):
                         try:
                             limited_toolbar[0].click()
-                            time.sleep(0.5)
                             # 尝试查找导出选项
                             export_menus = self.page.eles("@data-item-key=export")
                             if export_menus:
                                 export_menus[0].click()
-                                time.sleep(0.5)
+                                self.waiter.visible("@data-item-key=exportAsPPT", "export_ppt_menu")
                                 # 尝试导出为PowerPoint
                                 ppt_export = self.page.eles("@data-item-key=exportAsPPT")
                                 if ppt_export:
                                     ppt_export[0].click()
                                     self.check_alert()
-                                    download_task = self.page.wait.download_begin(timeout=120)
+                                    download_task = self.waiter.download_begin()
                                     last_err = None
                                     break
                                 else:
@@ -516,15 +1004,15 @@ class Processer:
                                     if pdf_export:
                                         pdf_export[0].click()
                                         self.check_alert()
-                                        download_task = self.page.wait.download_begin(timeout=120)
+                                        download_task = self.waiter.download_begin()
                                         last_err = None
                                         break
                             last_err = Exception("未找到PPT导出选项")
-                            time.sleep(3)
+                            get_rate_limiter().retry_wait(i, last_err)
                             continue
                         except Exception as err:
                             last_err = err
-                            time.sleep(3)
+                            get_rate_limiter().retry_wait(i, err)
                             continue
                 else:
                     # 正常工具栏的处理方式
@@ -533,20 +1021,17 @@ class Processer:
                             normal_toolbar = self.page.eles("@data-testid=bi-toolbar-menu", timeout=2)
                             if normal_toolbar:
                                 normal_toolbar[0].click()
-                                time.sleep(0.5)
                                 # 文件菜单
-                                self.page.ele("@data-testid=menu-item-J_file").click()
-                                time.sleep(0.5)
+                                self.waiter.click("@data-testid=menu-item-J_file", "file_menu")
                                 # 导出子菜单
-                                self.page.ele("@data-testid=menu-item-J_fileExport").click()
-                                time.sleep(0.5)
+                                self.waiter.click("@data-testid=menu-item-J_fileExport", "export_menu")
 
                                 # 尝试找到PowerPoint导出选项
                                 ppt_menu = self.page.ele("@data-testid=menu-item-J_exportAsPPT")
                                 if ppt_menu:
                                     ppt_menu.ele("text:PowerPoint").click()
                                     self.check_alert()
-                                    download_task = self.page.wait.download_begin(timeout=120)
+                                    download_task = self.waiter.download_begin()
                                     last_err = None
                                     break
                                 else:
@@ -555,7 +1040,7 @@ class Processer:
                                     if download_button:
                                         download_button[0].click()
                                         self.check_alert()
-                                        download_task = self.page.wait.download_begin(timeout=120)
+                                        download_task = self.waiter.download_begin()
                                         last_err = None
                                         break
                                     else:
@@ -564,18 +1049,17 @@ class Processer:
                                         if pdf_menu:
                                             pdf_menu.ele("text:PDF").click()
                                             self.check_alert()
-                                            download_task = self.page.wait.download_begin(timeout=120)
+                                            download_task = self.waiter.download_begin()
                                             last_err = None
                                             break
                         except Exception as err:
                             last_err = err
-                            time.sleep(3)
+                            get_rate_limiter().retry_wait(i, err)
                             continue
                     else:
                         # 所有尝试都失败，记录为无权限
                         no_right_info = (file_path, node_name, file_type)
-                        no_right_files.append(no_right_info)
-                        write_failed_file("no_right_files.log", no_right_info)
+                        journal.record(KIND_NO_RIGHT, no_right_info, **node_fields(node_info))
                         logger.warning(f"[{self.idx}] PPT文件 {node_name} 无法导出或下载")
 
             elif "docx" in file_type or "doc" in file_type:
@@ -588,17 +1072,16 @@ class Processer:
                     if download_button:
                         download_button[0].click()
                         self.check_alert()
-                        download_task = self.page.wait.download_begin(timeout=120)
+                        download_task = self.waiter.download_begin()
                     else:
                         # 尝试通过工具栏导出
                         limited_toolbar = self.page.eles("@data-testid=doc-header-more-button", timeout=2)
                         if limited_toolbar:
                             limited_toolbar[0].click()
-                            time.sleep(0.5)
-                            self.page.ele("@data-item-key=export").click()
-                            self.page.ele("@data-item-key=exportAsWord").click()
+                            self.waiter.click("@data-item-key=export", "export_menu")
+                            self.waiter.click("@data-item-key=exportAsWord", "export_word")
                             self.check_alert()
-                            download_task = self.page.wait.download_begin(timeout=120)
+                            download_task = self.waiter.download_begin()
                         else:
                             download_task = False
                 except Exception as err:
@@ -614,7 +1097,7 @@ class Processer:
                     if download_button:
                         download_button[0].click()
                         self.check_alert()
-                        download_task = self.page.wait.download_begin(timeout=120)
+                        download_task = self.waiter.download_begin()
                     else:
                         download_task = False
                 except Exception as err:
@@ -629,7 +1112,7 @@ class Processer:
                     if download_button:
                         download_button[0].click()
                         self.check_alert()
-                        download_task = self.page.wait.download_begin(timeout=120)
+                        download_task = self.waiter.download_begin()
                     else:
                         download_task = False
                 except Exception as err:
@@ -644,7 +1127,7 @@ class Processer:
                     if download_button:
                         download_button[0].click()
                         self.check_alert()
-                        download_task = self.page.wait.download_begin(timeout=120)
+                        download_task = self.waiter.download_begin()
                     else:
                         # 文本文件可能需要先打开查看
                         # 尝试获取文本内容并保存
@@ -656,7 +1139,8 @@ class Processer:
                             with open(text_file, 'w', encoding='utf-8') as f:
                                 f.write(text_content)
                             logger.info(f"[{self.idx}] 文本内容已保存到: {text_file}")
-                            download_task = type('obj', (object,), {'is_done': True, 'state': 'completed'})()
+                            download_task = type('obj', (object,), {'is_done': True, 'state': 'completed',
+                                                                    'final_path': str(text_file)})()
                         else:
                             download_task = False
                 except Exception as err:
@@ -671,13 +1155,12 @@ class Processer:
                     img_element = self.page.ele("img", timeout=5)
                     if img_element:
                         img_element.right_click()
-                        time.sleep(1)
                         # 查找保存图片选项
                         save_option = self.page.ele("text:图片另存为", timeout=2) or \
                                      self.page.ele("text:Save image as", timeout=2)
                         if save_option:
                             save_option.click()
-                            download_task = self.page.wait.download_begin(timeout=120)
+                            download_task = self.waiter.download_begin()
                         else:
                             download_task = False
                     else:
@@ -685,7 +1168,7 @@ class Processer:
                         if download_button:
                             download_button[0].click()
                             self.check_alert()
-                            download_task = self.page.wait.download_begin(timeout=120)
+                            download_task = self.waiter.download_begin()
                         else:
                             download_task = False
                 except Exception as err:
@@ -700,7 +1183,7 @@ class Processer:
                     if download_button:
                         download_button[0].click()
                         self.check_alert()
-                        download_task = self.page.wait.download_begin(timeout=120)
+                        download_task = self.waiter.download_begin()
                     else:
                         download_task = False
                 except Exception as err:
@@ -724,7 +1207,7 @@ class Processer:
                                 logger.info(f"[{self.idx}] 找到标准下载按钮，尝试下载")
                                 download_button[0].click()
                                 self.check_alert()
-                                download_task = self.page.wait.download_begin(timeout=120)
+                                download_task = self.waiter.download_begin()
                                 break
                             else:
                                 logger.info(f"[{self.idx}] 未找到标准下载按钮")
@@ -748,7 +1231,7 @@ class Processer:
                                     logger.info(f"[{self.idx}] 找到下载元素: {selector}")
                                     download_elements[0].click()
                                     self.check_alert()
-                                    download_task = self.page.wait.download_begin(timeout=120)
+                                    download_task = self.waiter.download_begin()
                                     break
                             if download_task:
                                 break
@@ -760,19 +1243,17 @@ class Processer:
                             if toolbar_menus:
                                 logger.info(f"[{self.idx}] 尝试通过文件菜单导出")
                                 toolbar_menus[0].click()
-                                time.sleep(0.5)
 
                                 # 文件菜单
-                                file_menu = self.page.ele("@data-testid=menu-item-J_file", timeout=2)
+                                file_menu = self.waiter.visible("@data-testid=menu-item-J_file", "file_menu", timeout=2)
                                 if file_menu:
                                     file_menu.click()
-                                    time.sleep(0.5)
 
                                     # 导出或下载
-                                    export_menu = self.page.ele("@data-testid=menu-item-J_fileExport", timeout=2)
+                                    export_menu = self.waiter.visible("@data-testid=menu-item-J_fileExport",
+                                                                      "export_menu", timeout=2)
                                     if export_menu:
                                         export_menu.click()
-                                        time.sleep(0.5)
 
                                         # 查找原格式下载
                                         download_original = self.page.ele("text:原格式", timeout=2) or \
@@ -781,99 +1262,205 @@ class Processer:
                                         if download_original:
                                             download_original.click()
                                             self.check_alert()
-                                            download_task = self.page.wait.download_begin(timeout=120)
+                                            download_task = self.waiter.download_begin()
                                             break
 
                     except Exception as err:
                         logger.warning(f"[{self.idx}] 下载尝试 {attempt+1} 失败: {err}")
                         last_err = err
-                        time.sleep(2)
+                        get_rate_limiter().retry_wait(attempt, err)
                         continue
 
                 # 处理下载结果
                 if download_task:
                     logger.info(f"[{self.idx}] 成功触发下载任务: {fname}")
-                    # 等待下载
-                    while not download_task.is_done:
-                        time.sleep(.5)
-                    if not download_task.final_path and not download_task.state == "skipped":
-                        logger.info(f"[{self.idx}] 下载{fname} 任务失败 任务最终状态：{download_task.state}")
-                        if "blob" not in download_task.url:
-                            # 确保headers和cookies是有效的
-                            headers = getattr(self, 'headers', {})
-                            cookies = getattr(self, 'cookies', {})
-                            res = (node_info, download_task.url, headers, cookies, str(fname.absolute()), node_name)
-                            download_queue.put(res)
-                            logger.info(f"[{self.idx}] 生成下载{fname}任务")
                 else:
                     need_restart = True
                     logger.error(f"[{self.idx}] 所有下载尝试都失败: {fname}")
 
                     # 如果是未知格式，记录为无法处理而不是无权限
-                    skipped_info = (node_name, file_type, f"未知格式，下载失败")
-                    skipped_files.append(skipped_info)
-                    write_failed_file("skipped_files.log", skipped_info)
+                    skipped_info = (node_name, file_type, "未知格式，下载失败")
+                    journal.record(KIND_SKIPPED, skipped_info, **node_fields(node_info))
             if last_err:
                 raise last_err
             need_restart = False
             if not download_task:
                 need_restart = True
             else:
-                # 等待下载
-                while not download_task.is_done:
-                    time.sleep(.5)
-                if not download_task.final_path and not download_task.state == "skipped":
-                    logger.info(f"[{self.idx}] 下载{fname} 任务失败 任务最终状态：{download_task.state}")
-                    if "blob" not in download_task.url:
-                        res = (node_info, download_task.url, self.headers, self.cookies, str(fname.absolute()), node_name)
-                        download_queue.put(res)
-                        logger.info(f"[{self.idx}] 生成下载{fname}任务")
+                # 不等待下载完成，由监视线程处理结果并在结束后归还导出名额
+                export_monitor.track(download_task,
+                                     partial(export_done, node_info, fname, self.headers, self.cookies),
+                                     on_finish=self.export_slots.release)
+                tracked = True
+                # 浏览器操作成功同样重置熔断器的连续失败计数，避免零散的页面失败累计触发熔断
+                get_rate_limiter().record_success()
             if need_restart:
                 logger.error(f"[{self.idx}] 下载：{fname} 未完成任务生成就结束了，重试一次")
-                proceed_files.remove(node_uuid)
-                return self.process_file(node_info, retry_times + 1)
+                retry = True
         except Exception as e:
             logger.error(f"[{self.idx}] 下载：{fname} 时出现问题，可能是无下载权限造成的：{e} {traceback.format_exc()}")
             # no_right_files.append((file_path, node_name, file_type))
+            state_store.mark(node_uuid, STATUS_FAILED, add_attempt=True)
+            retry = True
+        finally:
+            metrics.observe("stage_seconds", time.perf_counter() - export_started, stage="export_trigger")
+            tracer.complete("export_trigger", "stage", export_started, time.perf_counter() - export_started,
+                            idx=self.idx, file=node_name)
+            metrics.inc("exports_total", result="started" if tracked else "retry")
+            if not tracked:
+                self.export_slots.release()
+        if retry:
             proceed_files.remove(node_uuid)
-            return self.process_file(node_info, retry_times+1)
-        logger.info(f"[{self.idx}] 已完成处理文件:{node_name} 路径：{file_path} 文件类型：{file_type}，等待..")
-        time.sleep(0.5)
+            return self.process_file(node_info, retry_times + 1)
+        logger.info(f"[{self.idx}] 已提交导出文件:{node_name} 路径：{file_path} 文件类型：{file_type}")
         return True
 
 
 if __name__ == "__main__":
     # 初始化日志文件
-    FAILED_FILES_LOG, NO_RIGHT_FILES_LOG, SKIPPED_FILES_LOG = init_log_files()
+    FAILED_FILES_LOG, NO_RIGHT_FILES_LOG, SKIPPED_FILES_LOG = init_log_files(JOURNAL_FILE)
+    journal.start()
 
-    threads = []
-    q = Queue()
+    # 文件夹优先、按子树分配给浏览器的调度器
+    NODE_QUEUE_MEMORY = int(os.getenv("NODE_QUEUE_MEMORY", "5000"))
+    NODE_SPILL_FILE = os.getenv("NODE_SPILL_FILE", "frontier.db")
+    q = WorkScheduler(memory_limit=NODE_QUEUE_MEMORY, spill_path=NODE_SPILL_FILE)
+    state_store.begin_run(SYNC_MODE)
+    # 载入上次运行的状态：已发现的节点不再重复入队，未完成的节点直接续跑
+    discovered_nodes, done_nodes, pending_nodes = state_store.restore()
+    if SYNC_MODE == "incremental":
+        # 增量同步时重新发现所有节点，由修改版本决定是否处理
+        proceed_node.update(pending_nodes)
+    else:
+        proceed_node.update(discovered_nodes)
+    if LIST_MODE == "api":
+        dentry_lister = DentryLister(
+            on_listed=lambda data: process_req(q, data),
+            # 接口多次请求失败的文件夹交回浏览器点击展开
+            on_failed=q.put,
+            workers=int(os.getenv("LIST_WORKERS", "16")),
+            uuid_param=os.getenv("DENTRY_LIST_UUID_PARAM", "dentryUuid"),
+            cursor_param=os.getenv("DENTRY_LIST_CURSOR_PARAM", "loadMoreId"),
+            has_more_key=os.getenv("DENTRY_LIST_HAS_MORE_KEY", "hasMore"),
+            # 待展开的文件夹同样超过上限后暂存到磁盘
+            folder_queue=SpillQueue(NODE_QUEUE_MEMORY, f"{os.path.splitext(NODE_SPILL_FILE)[0]}-folders.db"),
+        )
+        dentry_lister.start()
+    for pending_node in state_store.iter_pending():
+        if dentry_lister and not is_file_node(pending_node):
+            dentry_lister.submit(pending_node)
+        else:
+            q.put(pending_node)
     logger.info("启动浏览器。。。")
-    for i in range(5):
-        thread = Thread(target=request_repeater, args=(q,))
-        thread.start()
-
-    for i in range(5):
-        thread = Thread(target=process_download, args=())
-        thread.start()
-
-    for i in range(5):
-        thread = Thread(target=Processer(q, i).run, args=())
-        thread.start()
-    input(f"请完成所有浏览器的登录，并在完成后任意键继续")
-    loggined_done = True
-    input(f"全部下载完成后任意键继续")
+    if IO_ENGINE == "asyncio" and httpx is None:
+        # 没有原生异步客户端时事件循环只能用 IO_CONCURRENCY 个线程执行同步请求，不如直接使用固定线程
+        logger.warning("未安装 httpx，HTTP工作方式改为 threads（pip install httpx）")
+        IO_ENGINE = "threads"
+    if IO_ENGINE == "asyncio":
+        io_engine = AsyncIOEngine(
+            concurrency=int(os.getenv("IO_CONCURRENCY", "100")),
+            http2=os.getenv("HTTP2", "0") == "1",
+            timeout=float(os.getenv("HTTP_TIMEOUT", "60")),
+        )
+        io_engine.start()
+        io_engine.consume(req_queue, request_repeater_async, name="req-bridge")
+        io_engine.consume(download_queue, process_download_async, name="download-bridge")
+    else:
+        for i in range(5):
+            thread = Thread(target=request_repeater, args=(q,), name=f"repeater-{i}", daemon=True)
+            thread.start()
 
+        for i in range(5):
+            thread = Thread(target=process_download, args=(), name=f"downloader-{i}", daemon=True)
+            thread.start()
 
-    [x.join() for x in threads]
-    time.sleep(5)
-    while q.qsize():
-        time.sleep(10)
+    export_monitor.start()
+    content_store.start()
+
+    # 完成判定：每个工作在它产生的后续工作入队后才标记完成，所有阶段都为0即抓取完成
+    completion.source("nodes", q.unfinished)
+    completion.source("list_requests", lambda: req_queue.unfinished_tasks)
+    completion.source("downloads", lambda: download_queue.unfinished_tasks)
+    completion.source("exports", export_monitor.unfinished)
+    if dentry_lister:
+        completion.source("folders", dentry_lister.unfinished)
+    completion.source("dedup", content_store.unfinished)
+    # 浏览器打开组织页面、根目录的子节点入队之前不能判定完成
+    completion.hold("root")
+
+    # 运行指标：各阶段耗时、计数、队列长度，通过本地接口或快照文件输出
+    metrics.gauge("queue_depth", lambda: {
+        (("queue", "nodes"),): q.qsize(),
+        (("queue", "nodes_spilled"),): q.spilled(),
+        (("queue", "list_requests"),): req_queue.qsize(),
+        (("queue", "downloads"),): download_queue.qsize(),
+        (("queue", "exports"),): export_monitor.pending(),
+    }, "各队列中待处理的数量")
+    metrics.gauge("scheduler_assignments", lambda: {
+        (("decision", key),): value for key, value in q.summary().items()
+        if key in ("folders", "files", "own", "claimed", "stolen_groups", "stolen_nodes")
+    }, "调度器累计的分配情况（文件夹/文件、同浏览器、认领、接手子树）")
+    metrics.gauge("browsers_alive", lambda: browser_pool.alive() if browser_pool else None, "运行中的浏览器工作线程数")
+    metrics.gauge("results", lambda: {(("kind", kind),): journal.count(kind)
+                                      for kind in (KIND_DONE, KIND_FAILED, KIND_NO_RIGHT, KIND_SKIPPED, KIND_DELETED)},
+                  "各类处理结果的数量")
+    # 时间线追踪（可选）：各线程的处理阶段和队列等待，Chrome trace-event 格式
+    if os.getenv("TRACE_FILE"):
+        tracer.counter("queues", lambda: {"nodes": q.qsize(), "nodes_spilled": q.spilled(),
+                                          "list_requests": req_queue.qsize(), "downloads": download_queue.qsize(),
+                                          "exports": export_monitor.pending()})
+        tracer.start(os.getenv("TRACE_FILE"), sample_interval=float(os.getenv("TRACE_SAMPLE_MS", "0")) / 1000)
+    metrics.describe("stage_seconds", "各处理阶段的耗时（秒）")
+    metrics.describe("wait_seconds", "页面等待各步骤的耗时（秒）")
+    metrics.describe("bytes_total", "保存的字节数")
+    MetricsExporter(
+        port=int(os.getenv("METRICS_PORT", "0")),
+        host=os.getenv("METRICS_HOST", "127.0.0.1"),
+        snapshot_file=os.getenv("METRICS_FILE", ""),
+        interval=float(os.getenv("METRICS_INTERVAL", "30")),
+    ).start()
+
+    # 定期输出连接复用统计（确认高负载下没有反复握手）及各步骤的等待耗时
+    Thread(target=report_stats, args=(int(os.getenv("HTTP_STATS_INTERVAL", "60")),), daemon=True).start()
+
+    # 只登录一次：保存的会话有效时直接使用，否则打开可见浏览器等待登录，自动检测登录完成
+    session_cookies = SessionBootstrap(
+        launch_browser,
+        f'https://alidocs.dingtalk.com/i/spaces/{target_orgid}/overview?corpId={corpId}',
+        session_file=os.getenv("SESSION_FILE", "session.json"),
+        timeout=float(os.getenv("LOGIN_TIMEOUT", "600")),
+    ).ensure()
+    loggined_done = True
+    browser_pool = BrowserPool(
+        new_processer,
+        size=int(os.getenv("BROWSER_POOL_SIZE", "0")) or auto_pool_size(
+            int(os.getenv("BROWSER_MEMORY_MB", "800")) if BROWSER_TABS == 1 else int(os.getenv("BROWSER_TAB_MEMORY_MB", "250")),
+            int(os.getenv("BROWSER_POOL_MAX", "8"))),
+        min_size=int(os.getenv("BROWSER_POOL_MIN", "1")),
+        max_size=int(os.getenv("BROWSER_POOL_MAX", "8")),
+        on_lost=requeue_lost,
+        queue=q,
+        stuck_timeout=float(os.getenv("BROWSER_STUCK_TIMEOUT", "900")),
+        max_memory_mb=float(os.getenv("BROWSER_MAX_MEMORY_MB", "2048")),
+        scale_up_queue=int(os.getenv("BROWSER_SCALE_UP_QUEUE", "50")),
+    )
+    browser_pool.start()
+    browser_pool.scaling = True
+    # 所有阶段的工作都完成后通知浏览器退出
+    completed = completion.wait(browser_pool.alive)
+    browser_pool.shutdown()
+    close_tab_hosts()
+
+    if SYNC_MODE == "incremental" and completed:
+        handle_deleted()
+    state_store.finish_run()
 
     # 生成详细的下载报告
     log_files = (FAILED_FILES_LOG, NO_RIGHT_FILES_LOG, SKIPPED_FILES_LOG)
-    generate_download_report(proceed_files, proceed_node, no_right_files,
-                           failed_files, skipped_files, log_files)
-
-    input("\n全部抓取完成，任意键退出")
+    journal.close()
+    tracer.close()
+    generate_download_report(JOURNAL_FILE, log_files, (len(proceed_files), len(proceed_node)),
+                             db_path=os.getenv("STATE_DB", "crawl_state.db"),
+                             folder_depth=int(os.getenv("REPORT_FOLDER_DEPTH", "1")))
+    logger.info("全部抓取完成")
 
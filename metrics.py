@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+运行指标模块
+按阶段统计耗时分布（直方图）、计数器、队列长度等即时值以及传输字节数，
+通过本地 HTTP 接口输出 Prometheus 文本格式（/metrics）和 JSON（/metrics.json），
+或定期写入 JSON 快照文件，用于定位瓶颈
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+from tracing import tracer
+
+# 指标名前缀
+PREFIX = "alidocs_"
+# 耗时直方图分桶上界（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    escaped = [(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in items]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """
+        分位数（取所在分桶的上界，超过最大分桶时为最大值）
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    进程内的指标登记表，线程安全
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # 名称 -> {标签: 值}
+        self._counters = {}
+        self._histograms = {}
+        # 名称 -> (说明, 取值函数)，取值函数返回数值或 {标签字典元组: 数值}
+        self._gauges = {}
+        self._help = {}
+        self.started_at = time.time()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        """
+        计数器加 value
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        在直方图中记录一次取值（耗时，秒）
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def gauge(self, name, func, help_text=""):
+        """
+        登记一个即时值（如队列长度），输出时调用 func 取值
+        """
+        self._gauges[name] = func
+        if help_text:
+            self._help[name] = help_text
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """
+        统计一个阶段的耗时（stage_seconds），出错时计入 stage_errors_total；开启追踪时同时记录到时间线
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage_seconds", elapsed, stage=stage, **labels)
+            tracer.complete(stage, "stage", start, elapsed, **labels)
+
+    def _gauge_values(self):
+        values = {}
+        for name, func in list(self._gauges.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            values[name] = value if isinstance(value, dict) else {(): value}
+        return values
+
+    def snapshot(self):
+        """
+        所有指标的当前值（JSON可序列化）
+        """
+        def labels_text(key):
+            return ",".join(f"{k}={v}" for k, v in key) or "_"
+
+        with self._lock:
+            counters = {name: {labels_text(k): v for k, v in series.items()} for name, series in self._counters.items()}
+            histograms = {
+                name: {labels_text(k): {"count": h.count, "sum": round(h.sum, 3),
+                                        "avg": round(h.sum / h.count, 3) if h.count else 0,
+                                        "p50": round(h.quantile(0.5), 3), "p90": round(h.quantile(0.9), 3),
+                                        "p99": round(h.quantile(0.99), 3), "max": round(h.max, 3)}
+                       for k, h in series.items()}
+                for name, series in self._histograms.items()}
+        gauges = {name: {labels_text(k): v for k, v in series.items()} for name, series in self._gauge_values().items()}
+        return {"time": time.time(), "uptime": round(time.time() - self.started_at, 1),
+                "counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def render(self):
+        """
+        Prometheus 文本格式
+        """
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {PREFIX}{name} {self._help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                header(name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                header(name, "histogram")
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, count in zip(h.buckets, h.counts):
+                        cumulative += count
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, [('le', str(bound))])} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, [('le', '+Inf')])} {h.count}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {h.count}")
+        for name, series in sorted(self._gauge_values().items()):
+            header(name, "gauge")
+            for key, value in series.items():
+                lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            body, content_type = metrics.render(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, content_type = json.dumps(metrics.snapshot(), ensure_ascii=False), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter:
+    """
+    输出指标：本地 HTTP 接口和/或定期写入的 JSON 快照文件（包含两次快照之间的传输速率）
+    """
+
+    def __init__(self, port=0, host="127.0.0.1", snapshot_file="", interval=30):
+        """
+        Args:
+            port: HTTP 接口端口，0 为不启动
+            host: HTTP 接口监听地址
+            snapshot_file: JSON 快照文件，留空为不写入
+            interval: 写入快照的间隔（秒）
+        """
+        self.port = port
+        self.host = host
+        self.snapshot_file = snapshot_file
+        self.interval = interval
+        self._last = None
+
+    def start(self):
+        if self.port:
+            server = ThreadingHTTPServer((self.host, self.port), _Handler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"运行指标：http://{self.host}:{self.port}/metrics")
+        if self.snapshot_file:
+            threading.Thread(target=self._writer, name="metrics-file", daemon=True).start()
+
+    def _rates(self, snapshot):
+        """
+        两次快照之间 bytes_total 各标签的每秒字节数
+        """
+        current = snapshot["counters"].get("bytes_total", {})
+        rates = {}
+        if self._last:
+            last_time, last_bytes = self._last
+            elapsed = snapshot["time"] - last_time
+            if elapsed > 0:
+                rates = {k: round((v - last_bytes.get(k, 0)) / elapsed, 1) for k, v in current.items()}
+        self._last = (snapshot["time"], current)
+        return rates
+
+    def write_snapshot(self):
+        snapshot = metrics.snapshot()
+        snapshot["bytes_per_second"] = self._rates(snapshot)
+        tmp = f"{self.snapshot_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.snapshot_file)
+
+    def _writer(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                logger.error(f"写入运行指标快照出错：{e}")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+限流与重试模块
+按接口类型划分的令牌桶限流、带随机抖动的指数退避、429/Retry-After 处理，
+以及所有线程共享的熔断器；HTTP请求和浏览器操作的重试都经由这里
+"""
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from loguru import logger
+
+# 接口类型
+ENDPOINT_LIST = "dentry_list"   # 目录接口请求
+ENDPOINT_DOWNLOAD = "download"  # 文件下载
+ENDPOINT_EXPORT = "export"      # 浏览器导出操作
+
+
+class ThrottledError(Exception):
+    """
+    服务端限流（429/503），retry_after 为服务端要求的等待秒数
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """
+    解析 Retry-After 头，支持秒数和HTTP日期两种格式
+
+    Returns:
+        float|None: 需要等待的秒数
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def raise_for_throttle(response):
+    """
+    响应为429或503时抛出 ThrottledError
+    """
+    if response.status_code in (429, 503):
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        raise ThrottledError(f"服务端限流，返回状态码{response.status_code}", retry_after)
+
+
+class TokenBucket:
+    """
+    令牌桶：平均每秒 rate 个请求，允许 burst 个突发；rate 为0时不限流
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        尝试取得一个令牌，不阻塞
+
+        Returns:
+            float: 0表示已取得令牌，否则为还需等待的秒数
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 failure_threshold 次后断开，所有线程暂停 reset_timeout 秒，
+    之后放行请求试探，成功一次即恢复；服务端返回 Retry-After 时所有线程一起等待相应时间
+    """
+
+    def __init__(self, failure_threshold=20, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """
+        距离熔断结束还有多少秒，未熔断时返回0
+        """
+        with self._lock:
+            return max(0.0, self.open_until - time.monotonic())
+
+    def wait(self):
+        """
+        熔断期间阻塞调用线程直到冷却结束
+        """
+        while True:
+            remaining = self.remaining()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 5))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.open_until = 0.0
+
+    def record_failure(self, retry_after=None):
+        """
+        Args:
+            retry_after: 服务端要求的等待时间（秒）
+        """
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                cooldown = max(self.reset_timeout, retry_after or 0)
+            elif retry_after:
+                cooldown = retry_after
+            else:
+                return
+            until = time.monotonic() + cooldown
+            if until > self.open_until:
+                logger.warning(f"触发熔断（连续失败{self.failures}次），暂停所有请求{cooldown:.1f}秒")
+                self.open_until = until
+
+
+class RateLimiter:
+    """
+    统一的限流与重试入口
+    """
+
+    def __init__(self, rates=None, max_attempts=10, base_delay=1.0, max_delay=60.0, breaker=None):
+        """
+        Args:
+            rates: {接口类型: 每秒请求数}，未配置的接口类型不限流
+            max_attempts: 默认最大尝试次数
+            base_delay: 退避基础时间（秒）
+            max_delay: 单次退避的最长时间（秒）
+            breaker: 共享熔断器
+        """
+        self.rates = rates or {}
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, endpoint):
+        with self._lock:
+            if endpoint not in self._buckets:
+                self._buckets[endpoint] = TokenBucket(self.rates.get(endpoint, 0))
+            return self._buckets[endpoint]
+
+    def acquire(self, endpoint):
+        """
+        发起一次请求/操作前调用：等待熔断结束并取得令牌
+        """
+        self.breaker.wait()
+        self.bucket(endpoint).acquire()
+
+    def backoff(self, attempt):
+        """
+        第 attempt 次失败后的等待时间：指数退避 + 全随机抖动
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def retry_wait(self, attempt, err=None):
+        """
+        一次尝试失败后调用：记录到熔断器并按退避策略等待
+        """
+        self.breaker.record_failure(getattr(err, "retry_after", None))
+        time.sleep(self.backoff(attempt))
+        # 服务端要求的等待由熔断器统一执行
+        self.breaker.wait()
+
+    def record_success(self):
+        self.breaker.record_success()
+
+    def call(self, endpoint, func, *args, attempts=None, desc="", **kwargs):
+        """
+        带限流和重试地调用 func，全部尝试失败后抛出最后一次的异常
+
+        Args:
+            endpoint: 接口类型，决定使用哪个令牌桶
+            func: 要调用的函数
+            attempts: 最大尝试次数，默认使用 max_attempts
+            desc: 日志中的操作描述
+        """
+        attempts = attempts or self.max_attempts
+        last_err = None
+        for attempt in range(attempts):
+            self.acquire(endpoint)
+            try:
+                result = func(*args, **kwargs)
+                self.record_success()
+                return result
+            except Exception as e:
+                last_err = e
+                logger.error(f"{desc} 重试{attempt} 出错：{e}")
+                if attempt < attempts - 1:
+                    self.retry_wait(attempt, e)
+        raise last_err
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    获取进程内共享的限流器，首次调用时按 .env 配置创建
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(
+                rates={
+                    ENDPOINT_LIST: float(os.getenv("RATE_LIMIT_LIST", "10")),
+                    ENDPOINT_DOWNLOAD: float(os.getenv("RATE_LIMIT_DOWNLOAD", "10")),
+                    ENDPOINT_EXPORT: float(os.getenv("RATE_LIMIT_EXPORT", "0")),
+                },
+                max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "10")),
+                base_delay=float(os.getenv("RETRY_BASE_DELAY", "1")),
+                max_delay=float(os.getenv("RETRY_MAX_DELAY", "60")),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "20")),
+                    reset_timeout=float(os.getenv("BREAKER_RESET_TIMEOUT", "60")),
+                ),
+            )
+        return _limiter
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+下载报告模块
+从结果日志（results.jsonl）流式读取记录，一次遍历完成按类型、目录、失败原因的统计以及字节数和耗时分布，
+内存占用与记录数无关（明细先写入临时文件，统计分组数有上限）；也可用于仍在运行或异常退出的任务：
+
+    python report.py [results.jsonl] [--db crawl_state.db]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from journal import KIND_DONE, KIND_FAILED, KIND_NO_RIGHT, KIND_SKIPPED, KIND_DELETED, KIND_LOGS
+
+# 统计分组数超过上限后归入该分组
+OTHER_GROUP = "（其他）"
+# 控制台中每类明细只显示前若干条
+PREVIEW_SIZE = 20
+DETAIL_KINDS = (KIND_NO_RIGHT, KIND_FAILED, KIND_SKIPPED, KIND_DELETED)
+
+
+def iter_journal(path):
+    """
+    逐行读取结果日志，跳过无法解析的行（进程异常退出时最后一行可能不完整）
+
+    Yields:
+        dict: 一条记录
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("kind") in KIND_LOGS:
+                yield record
+
+
+def load_state_counts(db_path):
+    """
+    以只读方式读取抓取状态数据库中各状态的节点数，运行中的任务同样可以读取
+
+    Returns:
+        dict: 状态 -> 节点数，数据库不存在时为空
+    """
+    if not db_path or not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(f"file:{Path(db_path).absolute().as_posix()}?mode=ro", uri=True)
+    try:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM dentries GROUP BY status"))
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
+
+class CappedCounter:
+    """
+    分组计数，分组数达到上限后新的分组计入 OTHER_GROUP
+    """
+
+    def __init__(self, max_groups=1000):
+        self.max_groups = max_groups
+        self.groups = {}
+
+    def add(self, key, **values):
+        if key not in self.groups and len(self.groups) >= self.max_groups:
+            key = OTHER_GROUP
+        group = self.groups.setdefault(key, {})
+        for name, value in values.items():
+            group[name] = group.get(name, 0) + value
+
+    def top(self, field, n=None):
+        items = sorted(self.groups.items(), key=lambda x: x[1].get(field, 0), reverse=True)
+        return items[:n] if n else items
+
+
+class DurationStats:
+    """
+    耗时分布：固定的几何分桶，分位数取所在分桶的上界
+    """
+
+    BUCKETS = [0.1 * 1.25 ** i for i in range(64)]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        index = 0
+        while index < len(self.BUCKETS) and seconds > self.BUCKETS[index]:
+            index += 1
+        self.histogram[index] += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(self.BUCKETS[index], self.max) if index < len(self.BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "total": round(self.total, 3), "mean": round(self.total / self.count, 3),
+                "min": round(self.min, 3), "max": round(self.max, 3),
+                "p50": round(self.quantile(0.5), 3), "p90": round(self.quantile(0.9), 3),
+                "p99": round(self.quantile(0.99), 3)}
+
+
+def format_detail(kind, record):
+    """
+    报告文件中一条明细的格式（与原报告一致）
+    """
+    if kind == KIND_NO_RIGHT:
+        return f"[{record.get('type')}] {record.get('path')}/{record.get('name')}"
+    if kind == KIND_FAILED:
+        return f"{record.get('name')} - {record.get('reason')}"
+    if kind == KIND_SKIPPED:
+        return f"[{record.get('type')}] {record.get('name')} - {record.get('reason')}"
+    return f"{record.get('name')} | {record.get('uuid')} | {record.get('output')}"
+
+
+class ReportBuilder:
+    """
+    一次遍历结果日志生成统计，明细写入临时文件，生成报告时再按类型依次拷贝
+    """
+
+    def __init__(self, folder_depth=1, max_groups=1000):
+        """
+        Args:
+            folder_depth: 按目录统计时使用的目录层级（1为知识库根目录下的一级目录）
+            max_groups: 每种统计的分组数上限
+        """
+        self.folder_depth = folder_depth
+        self.counts = dict.fromkeys(KIND_LOGS, 0)
+        self.by_type = CappedCounter(max_groups)
+        self.by_folder = CappedCounter(max_groups)
+        self.by_reason = CappedCounter(max_groups)
+        self.durations = {}
+        self.bytes = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.preview = {kind: [] for kind in DETAIL_KINDS}
+        self._details = {kind: tempfile.TemporaryFile("w+", encoding="utf-8") for kind in DETAIL_KINDS}
+
+    def _folder(self, record):
+        folder = record.get("folder")
+        if folder is None:
+            # 无权限记录只有完整路径
+            folder = record.get("path", "")
+        parts = [x for x in str(folder).replace("\\", "/").split("/") if x]
+        return "/".join(parts[:self.folder_depth]) or "/"
+
+    def add(self, record):
+        kind = record["kind"]
+        self.counts[kind] += 1
+        ts = record.get("ts")
+        if ts:
+            self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+            self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        size = record.get("bytes") or 0
+        self.bytes += size
+        self.by_type.add(record.get("type") or "", **{kind: 1}, bytes=size)
+        self.by_folder.add(self._folder(record), **{kind: 1}, bytes=size)
+        if kind == KIND_DONE:
+            if record.get("duration") is not None:
+                self.durations.setdefault(record.get("via") or "", DurationStats()).add(record["duration"])
+            return
+        if kind == KIND_FAILED:
+            self.by_reason.add(record.get("reason") or "", count=1)
+        line = format_detail(kind, record)
+        self._details[kind].write(line + "\n")
+        if len(self.preview[kind]) < PREVIEW_SIZE:
+            self.preview[kind].append(line)
+
+    def feed(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def close(self):
+        for f in self._details.values():
+            f.close()
+
+    def summary(self, state_counts=None):
+        """
+        机器可读的统计结果
+        """
+        return {
+            "generated_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "first_record": self.first_ts,
+            "last_record": self.last_ts,
+            "counts": self.counts,
+            "bytes": self.bytes,
+            "durations": {via: stats.summary() for via, stats in self.durations.items()},
+            "by_type": dict(self.by_type.top(KIND_DONE)),
+            "by_folder": dict(self.by_folder.top(KIND_DONE)),
+            "failure_reasons": {reason: x["count"] for reason, x in self.by_reason.top("count")},
+            "state": state_counts or {},
+        }
+
+    def write_text(self, path, totals, log_files, state_counts=None):
+        """
+        写入文本报告（原有格式，并增加按类型、目录的统计和耗时分布）
+
+        Args:
+            totals: (处理的文件数, 访问的节点数)
+        """
+        total_processed, total_nodes = totals
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("下载任务详细报告\n")
+            f.write("="*80 + "\n\n")
+            f.write(f"生成时间：{time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+
+            f.write("统计信息：\n")
+            f.write(f"  - 总共处理的文件数：{total_processed}\n")
+            f.write(f"  - 总共访问的节点数：{total_nodes}\n")
+            f.write(f"  - 完成文件数：{self.counts[KIND_DONE]}（{self.bytes / 1024 / 1024:.1f}MB）\n")
+            f.write(f"  - 无权限文件数：{self.counts[KIND_NO_RIGHT]}\n")
+            f.write(f"  - 下载失败文件数：{self.counts[KIND_FAILED]}\n")
+            f.write(f"  - 跳过文件数：{self.counts[KIND_SKIPPED]}\n")
+            f.write(f"  - 上游已删除节点数：{self.counts[KIND_DELETED]}\n\n")
+
+            if state_counts:
+                f.write("抓取状态：\n")
+                for status, count in sorted(state_counts.items(), key=lambda x: x[1], reverse=True):
+                    f.write(f"  {status}: {count}\n")
+                f.write("\n")
+
+            f.write("日志文件：\n")
+            f.write(f"  - 失败文件日志：{Path(log_files[0]).absolute()}\n")
+            f.write(f"  - 无权限文件日志：{Path(log_files[1]).absolute()}\n")
+            f.write(f"  - 跳过文件日志：{Path(log_files[2]).absolute()}\n\n")
+
+            titles = {KIND_NO_RIGHT: "无权限访问的文件", KIND_FAILED: "下载失败的文件",
+                      KIND_SKIPPED: "跳过的文件", KIND_DELETED: "上游已删除的节点"}
+            for kind in DETAIL_KINDS:
+                if not self.counts[kind]:
+                    continue
+                f.write(f"{titles[kind]} ({self.counts[kind]} 个)：\n")
+                details = self._details[kind]
+                details.flush()
+                details.seek(0)
+                for line in details:
+                    f.write(f"  {line}")
+                f.write("\n")
+
+            f.write("失败文件统计：\n")
+            f.write("-" * 40 + "\n")
+            for reason, x in self.by_reason.top("count"):
+                f.write(f"  {reason}: {x['count']} 个文件\n")
+            f.write("\n")
+
+            f.write("按文件类型统计（完成/失败/无权限/跳过，大小）：\n")
+            f.write("-" * 40 + "\n")
+            for ftype, x in self.by_type.top(KIND_DONE):
+                f.write(f"  {ftype or '-'}: {x.get(KIND_DONE, 0)}/{x.get(KIND_FAILED, 0)}/{x.get(KIND_NO_RIGHT, 0)}/"
+                        f"{x.get(KIND_SKIPPED, 0)}，{x.get('bytes', 0) / 1024 / 1024:.1f}MB\n")
+            f.write("\n")
+
+            f.write("按目录统计（完成/失败/无权限/跳过，大小）：\n")
+            f.write("-" * 40 + "\n")
+            for folder, x in self.by_folder.top(KIND_DONE):
+                f.write(f"  {folder}: {x.get(KIND_DONE, 0)}/{x.get(KIND_FAILED, 0)}/{x.get(KIND_NO_RIGHT, 0)}/"
+                        f"{x.get(KIND_SKIPPED, 0)}，{x.get('bytes', 0) / 1024 / 1024:.1f}MB\n")
+            f.write("\n")
+
+            if self.durations:
+                f.write("耗时分布（秒）：\n")
+                f.write("-" * 40 + "\n")
+                for via, stats in self.durations.items():
+                    s = stats.summary()
+                    f.write(f"  {via}: {s['count']} 个，平均 {s['mean']}，p50 {s['p50']}，p90 {s['p90']}，"
+                            f"p99 {s['p99']}，最长 {s['max']}\n")
+                f.write("\n")
+
+    def print_console(self, totals, log_files, report_file):
+        total_processed, total_nodes = totals
+        print("\n" + "="*80)
+        print("下载任务完成报告")
+        print("="*80)
+
+        print("\n统计信息：")
+        print(f"  - 总共处理的文件数：{total_processed}")
+        print(f"  - 总共访问的节点数：{total_nodes}")
+        print(f"  - 完成文件数：{self.counts[KIND_DONE]}（{self.bytes / 1024 / 1024:.1f}MB）")
+
+        titles = {KIND_NO_RIGHT: "❌ 无权限访问的文件", KIND_FAILED: "⚠️  下载失败的文件",
+                  KIND_SKIPPED: "⏭️  跳过的文件", KIND_DELETED: "🗑️  上游已删除的节点"}
+        for kind in DETAIL_KINDS:
+            count = self.counts[kind]
+            if not count:
+                continue
+            print(f"\n{titles[kind]} ({count} 个)：")
+            for i, line in enumerate(self.preview[kind], 1):
+                print(f"  {i:2d}. {line}")
+            if count > PREVIEW_SIZE:
+                print(f"     ... 还有 {count-PREVIEW_SIZE} 个文件")
+
+        print(f"\n📄 详细报告已保存到：{Path(report_file).absolute()}")
+        print("\n📝 失败文件实时日志：")
+        print(f"  - 下载失败：{Path(log_files[0]).absolute()}")
+        print(f"  - 无权限访问：{Path(log_files[1]).absolute()}")
+        print(f"  - 跳过文件：{Path(log_files[2]).absolute()}")
+        print("\n" + "="*80)
+
+
+def generate_download_report(journal_path, log_files, totals=None, db_path=None,
+                             report_file="download_report.txt", summary_file="download_report.json",
+                             folder_depth=1):
+    """
+    从结果日志生成下载报告：控制台摘要、文本报告和 JSON 统计
+
+    Args:
+        journal_path: 结果日志文件
+        log_files: 文本日志文件路径元组 (失败, 无权限, 跳过)
+        totals: (处理的文件数, 访问的节点数)，为None时从抓取状态数据库或结果日志推算
+        db_path: 抓取状态数据库，提供各状态的节点数
+        report_file: 文本报告文件
+        summary_file: JSON 统计文件
+        folder_depth: 按目录统计的目录层级
+
+    Returns:
+        dict: 统计结果
+    """
+    builder = ReportBuilder(folder_depth=folder_depth)
+    try:
+        if os.path.exists(journal_path):
+            builder.feed(iter_journal(journal_path))
+        state_counts = load_state_counts(db_path)
+        if totals is None:
+            files = sum(builder.counts[kind] for kind in (KIND_DONE, KIND_FAILED, KIND_NO_RIGHT, KIND_SKIPPED))
+            totals = (files, sum(state_counts.values()) or files)
+        # 先写入临时文件再替换，运行中生成报告时不会读到写了一半的报告
+        tmp = f"{report_file}.tmp"
+        builder.write_text(tmp, totals, log_files, state_counts)
+        shutil.move(tmp, report_file)
+        summary = builder.summary(state_counts)
+        summary["totals"] = {"files": totals[0], "nodes": totals[1]}
+        with open(f"{summary_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        shutil.move(f"{summary_file}.tmp", summary_file)
+        builder.print_console(totals, log_files, report_file)
+        return summary
+    finally:
+        builder.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="从结果日志生成下载报告（任务运行中或异常退出后均可使用）")
+    parser.add_argument("journal", nargs="?", default=os.getenv("JOURNAL_FILE", "results.jsonl"))
+    parser.add_argument("--db", default=os.getenv("STATE_DB", "crawl_state.db"), help="抓取状态数据库")
+    parser.add_argument("--report", default="download_report.txt")
+    parser.add_argument("--summary", default="download_report.json")
+    parser.add_argument("--folder-depth", type=int, default=int(os.getenv("REPORT_FOLDER_DEPTH", "1")))
+    args = parser.parse_args()
+    generate_download_report(args.journal, tuple(KIND_LOGS[kind][0] for kind in (KIND_FAILED, KIND_NO_RIGHT, KIND_SKIPPED)),
+                             db_path=args.db, report_file=args.report, summary_file=args.summary,
+                             folder_depth=args.folder_depth)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+任务调度模块
+代替所有浏览器共享的FIFO队列：文件夹优先（尽早完成目录发现），同一父节点下的节点分给
+目录树已经停留在该处的浏览器，空闲的浏览器可以接手其他浏览器的整个子树；
+内存中的待处理节点超过上限后，新发现的节点暂存到磁盘，内存中的节点取到一半以下时再按顺序读回
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from queue import Queue
+
+from loguru import logger
+
+from utils import is_file_node
+
+KIND_FOLDER = "folders"
+KIND_FILE = "files"
+# 没有父节点（知识库根目录下）的节点所在分组
+ROOT_GROUP = ""
+# 记录处理浏览器的文件夹数上限（用于子节点分组的归属，只保留最近的）
+TAKEN_BY_LIMIT = 10000
+
+
+def parent_of(node_info):
+    ancestor_list = node_info.get('ancestorList') or []
+    return ancestor_list[-1].get('dentryUuid') if ancestor_list else ROOT_GROUP
+
+
+class _Group:
+    """
+    同一父节点下待处理的子节点
+    """
+
+    def __init__(self, owner=None):
+        self.owner = owner
+        self.folders = deque()
+        self.files = deque()
+
+    def __len__(self):
+        return len(self.folders) + len(self.files)
+
+
+class FrontierSpill:
+    """
+    暂存到磁盘的待处理节点（SQLite），按类型先进先出；只在本次运行中使用，重启时由抓取状态恢复
+    """
+
+    def __init__(self, path):
+        self.path = path
+        for suffix in ("", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE frontier (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, node TEXT)")
+        self._conn.execute("CREATE INDEX frontier_kind ON frontier (kind, id)")
+        self.counts = {KIND_FOLDER: 0, KIND_FILE: 0}
+
+    def __len__(self):
+        return self.counts[KIND_FOLDER] + self.counts[KIND_FILE]
+
+    def push(self, kind, node_info):
+        self._conn.execute("INSERT INTO frontier (kind, node) VALUES (?, ?)",
+                           (kind, json.dumps(node_info, ensure_ascii=False)))
+        self.counts[kind] += 1
+
+    def pop(self, kind, limit):
+        """
+        按写入顺序取出最多 limit 个指定类型的节点
+        """
+        rows = self._conn.execute("SELECT id, node FROM frontier WHERE kind = ? ORDER BY id LIMIT ?",
+                                  (kind, limit)).fetchall()
+        if not rows:
+            return []
+        self._conn.execute("DELETE FROM frontier WHERE kind = ? AND id <= ?", (kind, rows[-1][0]))
+        self.counts[kind] -= len(rows)
+        return [json.loads(node) for _, node in rows]
+
+
+class SpillQueue(Queue):
+    """
+    内存中最多保留 memory_limit 个元素、超出部分暂存到磁盘的先进先出队列，
+    长度不限（put 不会阻塞），其余接口与 Queue 相同
+    """
+
+    def __init__(self, memory_limit=0, spill_path="frontier.db"):
+        self.memory_limit = memory_limit
+        self.spill_path = spill_path
+        super().__init__()
+
+    def _init(self, maxsize):
+        self.queue = deque()
+        self._spill = None
+
+    def _qsize(self):
+        return len(self.queue) + (len(self._spill) if self._spill else 0)
+
+    def _put(self, item):
+        if self.memory_limit and (len(self.queue) >= self.memory_limit or (self._spill and len(self._spill))):
+            if self._spill is None:
+                logger.info(f"队列超过{self.memory_limit}个，新元素暂存到{self.spill_path}")
+                self._spill = FrontierSpill(self.spill_path)
+            self._spill.push(KIND_FOLDER, item)
+        else:
+            self.queue.append(item)
+
+    def _get(self):
+        if not self.queue:
+            self.queue.extend(self._spill.pop(KIND_FOLDER, self.memory_limit))
+        return self.queue.popleft()
+
+
+class WorkScheduler:
+    """
+    按父节点分组的调度器，接口与 Queue 的 put/qsize/empty 兼容
+
+    memory_limit 大于0时内存中最多保留这么多待处理文件（以及这么多文件夹），超出的暂存到 spill_path，
+    qsize() 包括暂存的节点；文件夹单独计数，不会因为内存中已积压大量文件而被暂存到文件之后；
+    取出的节点处理结束后（包括它产生的子节点、下载任务等入队之后）需要调用 task_done，
+    unfinished() 为待处理和正在处理的节点数，用于判定抓取是否完成
+
+    分组的归属：父节点由哪个浏览器展开，子节点就优先分给哪个浏览器；
+    取任务的顺序：自己的文件夹 > 无主的文件夹 > 自己的文件 > 无主的文件 > 接手其他浏览器的分组
+    """
+
+    def __init__(self, memory_limit=0, spill_path="frontier.db"):
+        self._lock = threading.Lock()
+        self.memory_limit = memory_limit
+        self.spill_path = spill_path
+        self._spill = None
+        self._groups = {}
+        # (归属浏览器, 类型) -> 有该类型待处理节点的分组（dict 作为有序集合）
+        self._index = {}
+        # 文件夹 -> 处理它的浏览器，用于确定子节点分组的归属
+        self._taken_by = OrderedDict()
+        self._size = 0
+        # 内存中各类型的待处理节点数
+        self._memory = {KIND_FOLDER: 0, KIND_FILE: 0}
+        # 正在处理的节点 -> 取出次数（失败推回的节点可能同时被取出多次）
+        self._in_progress = {}
+        self._stats = {"folders": 0, "files": 0, "own": 0, "claimed": 0, "stolen_groups": 0, "stolen_nodes": 0}
+
+    def _link(self, key, group):
+        for kind in (KIND_FOLDER, KIND_FILE):
+            keys = self._index.setdefault((group.owner, kind), {})
+            if getattr(group, kind):
+                keys[key] = None
+            else:
+                keys.pop(key, None)
+
+    def _unlink(self, key, group):
+        for kind in (KIND_FOLDER, KIND_FILE):
+            self._index.get((group.owner, kind), {}).pop(key, None)
+
+    def _set_owner(self, key, group, owner):
+        self._unlink(key, group)
+        group.owner = owner
+        self._link(key, group)
+
+    def put(self, node_info):
+        with self._lock:
+            kind = KIND_FILE if is_file_node(node_info) else KIND_FOLDER
+            # 文件按内存中的全部节点数判断，文件夹只按内存中的文件夹数判断（保持文件夹优先）
+            size = self._size if kind == KIND_FILE else self._memory[KIND_FOLDER]
+            if self.memory_limit and (size >= self.memory_limit or (self._spill and self._spill.counts[kind])):
+                # 内存已满，或已有同类型节点在磁盘上（保持先进先出）
+                if self._spill is None:
+                    logger.info(f"调度：待处理节点超过{self.memory_limit}个，新节点暂存到{self.spill_path}")
+                    self._spill = FrontierSpill(self.spill_path)
+                self._spill.push(kind, node_info)
+                return
+            self._add(node_info)
+
+    def _add(self, node_info):
+        key = parent_of(node_info)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Group(self._taken_by.get(key))
+        if is_file_node(node_info):
+            group.files.append(node_info)
+        else:
+            group.folders.append(node_info)
+        self._link(key, group)
+        self._size += 1
+        self._memory[KIND_FILE if is_file_node(node_info) else KIND_FOLDER] += 1
+
+    def _refill(self):
+        """
+        从磁盘读回节点：内存中的文件夹不足上限的一半时读回文件夹，全部节点不足一半时读回文件
+        """
+        if not self._spill or not len(self._spill):
+            return
+        half = self.memory_limit // 2
+        if self._spill.counts[KIND_FOLDER] and self._memory[KIND_FOLDER] <= half:
+            for node_info in self._spill.pop(KIND_FOLDER, self.memory_limit - self._memory[KIND_FOLDER]):
+                self._add(node_info)
+        if self._spill.counts[KIND_FILE] and self._size <= half:
+            for node_info in self._spill.pop(KIND_FILE, self.memory_limit - self._size):
+                self._add(node_info)
+
+    def spilled(self):
+        """
+        暂存在磁盘上的节点数
+        """
+        return len(self._spill) if self._spill else 0
+
+    def qsize(self):
+        return self._size + self.spilled()
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def _first(self, owner, kind):
+        keys = self._index.get((owner, kind))
+        return next(iter(keys)) if keys else None
+
+    def _steal(self, worker):
+        """
+        从其他浏览器接手待处理节点最多的分组，有文件夹的分组优先
+        """
+        best = None
+        for key, group in self._groups.items():
+            if group.owner in (None, worker):
+                continue
+            rank = (bool(group.folders), len(group))
+            if best is None or rank > best[0]:
+                best = (rank, key, group)
+        if best is None:
+            return None
+        _, key, group = best
+        logger.info(f"[{worker}] 接手浏览器[{group.owner}]的子树{key}，待处理{len(group)}个节点")
+        self._stats["stolen_groups"] += 1
+        self._stats["stolen_nodes"] += len(group)
+        self._set_owner(key, group, worker)
+        return key
+
+    def get(self, worker=None):
+        """
+        为浏览器 worker 取出下一个节点，没有待处理节点时返回None
+        """
+        with self._lock:
+            self._refill()
+            if not self._size:
+                return None
+            key = None
+            for kind in (KIND_FOLDER, KIND_FILE):
+                for owner in (worker, None):
+                    key = self._first(owner, kind)
+                    if key is not None:
+                        break
+                if key is not None:
+                    break
+            else:
+                key = self._steal(worker)
+                if key is None:
+                    return None
+                kind = KIND_FOLDER if self._groups[key].folders else KIND_FILE
+            group = self._groups[key]
+            if group.owner != worker:
+                self._stats["claimed"] += 1
+                self._set_owner(key, group, worker)
+            else:
+                self._stats["own"] += 1
+            node_info = getattr(group, kind).popleft()
+            self._stats[kind] += 1
+            self._size -= 1
+            self._memory[kind] -= 1
+            if len(group):
+                self._link(key, group)
+            else:
+                self._unlink(key, group)
+                del self._groups[key]
+            if kind == KIND_FOLDER:
+                self._taken_by[node_info['dentryUuid']] = worker
+                if len(self._taken_by) > TAKEN_BY_LIMIT:
+                    self._taken_by.popitem(last=False)
+            self._in_progress[node_info['dentryUuid']] = self._in_progress.get(node_info['dentryUuid'], 0) + 1
+            return node_info
+
+    def task_done(self, node_info):
+        """
+        取出的节点处理结束，已经释放过（如被回收的浏览器的节点）时忽略
+        """
+        node_uuid = node_info['dentryUuid']
+        with self._lock:
+            count = self._in_progress.get(node_uuid)
+            if not count:
+                return
+            if count > 1:
+                self._in_progress[node_uuid] = count - 1
+            else:
+                del self._in_progress[node_uuid]
+
+    def unfinished(self):
+        """
+        待处理和正在处理的节点数
+        """
+        with self._lock:
+            return self.qsize() + sum(self._in_progress.values())
+
+    def summary(self):
+        with self._lock:
+            owners = {}
+            for group in self._groups.values():
+                owners[group.owner] = owners.get(group.owner, 0) + len(group)
+            return dict(self._stats, pending=self.qsize(), spilled=self.spilled(), groups=len(self._groups),
+                        pending_by_owner=owners)
+
+    def log_summary(self):
+        stat = self.summary()
+        logger.info(f"调度：待处理{stat['pending']}（{stat['groups']}组，磁盘暂存{stat['spilled']}） 已分配文件夹{stat['folders']} 文件{stat['files']} "
+                    f"同浏览器{stat['own']} 认领{stat['claimed']} 接手子树{stat['stolen_groups']}次/{stat['stolen_nodes']}个节点 "
+                    f"各浏览器待处理：{stat['pending_by_owner']}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+登录会话模块
+只登录一次：优先使用保存的会话（cookies），无效时打开一个可见浏览器等待登录并自动检测登录完成，
+之后把cookies保存到文件并复制给所有（无头）工作浏览器，不需要在命令行确认
+"""
+
+import json
+import time
+from pathlib import Path
+
+from loguru import logger
+
+# 未登录时钉钉会跳转到的登录页地址关键字
+LOGIN_URL_KEYWORDS = ("login", "passport")
+
+
+def is_logged_in(page):
+    """
+    页面停留在知识库域名下且没有跳转到登录页即视为已登录
+    """
+    url = str(page.url or "")
+    return "alidocs.dingtalk.com" in url and not any(x in url.lower() for x in LOGIN_URL_KEYWORDS)
+
+
+class SessionBootstrap:
+    """
+    登录会话的获取、检测和保存
+    """
+
+    def __init__(self, launch, entry_url, session_file="session.json", timeout=600, interval=2):
+        """
+        Args:
+            launch: 启动浏览器的函数，参数为 (用户数据目录编号, 是否无头)
+            entry_url: 登录后可访问的知识库页面，用于检测登录状态
+            session_file: 保存cookies的文件
+            timeout: 等待人工登录的最长时间（秒）
+            interval: 检测登录状态的间隔（秒）
+        """
+        self.launch = launch
+        self.entry_url = entry_url
+        self.session_file = Path(session_file)
+        self.timeout = timeout
+        self.interval = interval
+        self.cookies = []
+
+    def _load(self):
+        if not self.session_file.exists():
+            return []
+        try:
+            return json.loads(self.session_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取会话文件{self.session_file}失败：{e}")
+            return []
+
+    def _save(self, page):
+        self.cookies = [dict(x) for x in page.cookies(all_domains=True, all_info=True)]
+        self.session_file.write_text(json.dumps(self.cookies, ensure_ascii=False), encoding="utf-8")
+
+    def _check(self, page, checks=2):
+        """
+        打开知识库页面，连续 checks 次检测都已登录才算通过（避免跳转登录页之前的误判）
+        """
+        page.get(self.entry_url)
+        for _ in range(checks):
+            time.sleep(self.interval)
+            if not is_logged_in(page):
+                return False
+        return True
+
+    def _quit(self, page):
+        try:
+            page.quit()
+        except Exception:
+            pass
+
+    def restore(self):
+        """
+        用保存的会话（及登录用户数据目录）在无头浏览器中检测是否仍然有效
+        """
+        cookies = self._load()
+        page = self.launch("_login", True)
+        try:
+            if cookies:
+                page.set.cookies(cookies)
+            if self._check(page):
+                self._save(page)
+                return True
+            return False
+        finally:
+            self._quit(page)
+
+    def login(self):
+        """
+        打开可见浏览器等待人工登录，自动检测登录完成
+
+        Returns:
+            bool: 是否在超时时间内完成登录
+        """
+        page = self.launch("_login", False)
+        try:
+            page.get(self.entry_url)
+            logger.info(f"请在打开的浏览器中登录钉钉，登录完成后自动继续（最长等待{self.timeout}秒）")
+            deadline = time.monotonic() + self.timeout
+            while time.monotonic() < deadline:
+                if is_logged_in(page) and self._check(page):
+                    self._save(page)
+                    return True
+                time.sleep(self.interval)
+            return False
+        finally:
+            self._quit(page)
+
+    def ensure(self):
+        """
+        取得有效的登录会话，失败时抛出异常
+        """
+        if self.restore():
+            logger.info(f"已使用保存的会话登录（{len(self.cookies)}个cookies）")
+            return self.cookies
+        if not self.login():
+            raise Exception(f"{self.timeout}秒内未完成登录")
+        logger.info(f"登录完成，会话已保存到{self.session_file}")
+        return self.cookies
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+抓取状态存储模块
+使用SQLite（WAL模式）持久化记录每个节点的发现、处理状态，支持中断后断点续跑；
+同时记录每个节点的修改版本和最后一次出现的运行，用于增量同步和检测上游删除
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from loguru import logger
+
+from utils import is_file_node
+
+# 节点状态
+STATUS_DISCOVERED = "discovered"  # 已发现，尚未处理
+STATUS_LISTED = "listed"          # 文件夹已展开，子节点已记录
+STATUS_EXPORTED = "exported"      # 浏览器导出/下载完成
+STATUS_DOWNLOADED = "downloaded"  # 由下载线程下载完成
+STATUS_FAILED = "failed"          # 处理失败（下次运行会重试）
+STATUS_NO_RIGHT = "no-right"      # 无权限访问
+STATUS_DELETED = "deleted"        # 上游已删除（增量同步时检测）
+
+# 视为已完成、重启后无需再处理的状态
+DONE_STATUSES = (STATUS_LISTED, STATUS_EXPORTED, STATUS_DOWNLOADED, STATUS_NO_RIGHT, STATUS_DELETED)
+
+# dentry/list 返回数据中表示修改时间/版本的字段，按顺序取第一个存在的
+DEFAULT_VERSION_KEYS = "gmtModified,modifiedTime,updatedTime,updateTime,version"
+
+# 旧版本数据库中没有的列
+EXTRA_COLUMNS = {
+    "version": "TEXT",
+    "is_folder": "INTEGER",
+    "seen_run": "INTEGER",
+    "listed_run": "INTEGER",
+}
+
+
+class CrawlStateStore:
+    """
+    节点抓取状态存储
+
+    所有线程共享一个连接，写操作通过锁串行化；
+    已完成节点同时保存在内存集合中，判断是否跳过为O(1)且不访问数据库
+    """
+
+    def __init__(self, db_path="crawl_state.db", version_keys=DEFAULT_VERSION_KEYS):
+        """
+        Args:
+            db_path: 数据库文件路径
+            version_keys: 节点信息中表示修改时间/版本的字段名，逗号分隔
+        """
+        self.db_path = db_path
+        self.version_keys = [x.strip() for x in version_keys.split(",") if x.strip()]
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dentries (
+                dentry_uuid TEXT PRIMARY KEY,
+                parent_uuid TEXT,
+                name TEXT,
+                dentry_type TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                output_path TEXT,
+                node_json TEXT,
+                updated_at REAL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                mode TEXT,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        # 内容寻址：文件内容哈希 -> 第一次保存该内容的文件
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS contents (
+                digest TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(dentries)")}
+        for column, column_type in EXTRA_COLUMNS.items():
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE dentries ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+        self._done = set()
+        # 增量同步：本次运行已见过的节点、内容有更新需要重新导出的节点
+        self._seen = set()
+        self._changed = set()
+        self._warned_version = False
+        self.run_id = None
+
+    def begin_run(self, mode):
+        """
+        开始一次运行，之后出现的节点都记录为本次运行见过；失败次数按运行计算，开始时清零
+        """
+        with self._lock:
+            cursor = self._conn.execute("INSERT INTO runs (mode, started_at) VALUES (?, ?)", (mode, time.time()))
+            self._conn.execute("UPDATE dentries SET attempts = 0 WHERE attempts != 0")
+            self._conn.commit()
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def finish_run(self):
+        with self._lock:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), self.run_id))
+            self._conn.commit()
+
+    def version_of(self, node_info):
+        """
+        节点的修改时间/版本，节点信息中没有对应字段时返回None
+        """
+        for key in self.version_keys:
+            if node_info.get(key) is not None:
+                return str(node_info[key])
+        return None
+
+    def restore(self):
+        """
+        一次查询载入全部节点状态（只载入uuid，待处理节点的信息由 iter_pending 分批读取）
+
+        Returns:
+            tuple: (已发现节点uuid集合, 已完成节点uuid集合, 待处理节点uuid集合)
+        """
+        discovered = set()
+        pending = set()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dentry_uuid, status, node_json IS NOT NULL FROM dentries")
+            for dentry_uuid, status, has_node in rows:
+                discovered.add(dentry_uuid)
+                if status in DONE_STATUSES:
+                    self._done.add(dentry_uuid)
+                elif has_node:
+                    pending.add(dentry_uuid)
+        logger.info(f"载入抓取状态：已发现{len(discovered)}个节点，已完成{len(self._done)}个，待处理{len(pending)}个")
+        return discovered, set(self._done), pending
+
+    def iter_pending(self, batch_size=1000):
+        """
+        分批读取未完成节点的信息，避免一次载入全部节点
+
+        Yields:
+            dict: 节点信息
+        """
+        last_rowid = 0
+        placeholders = ",".join("?" * len(DONE_STATUSES))
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT rowid, node_json FROM dentries WHERE rowid > ? AND node_json IS NOT NULL "
+                    f"AND status NOT IN ({placeholders}) ORDER BY rowid LIMIT ?",
+                    (last_rowid, *DONE_STATUSES, batch_size)).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            for _, node_json in rows:
+                yield json.loads(node_json)
+
+    def is_done(self, dentry_uuid):
+        return dentry_uuid in self._done
+
+    def record_discovered(self, node_info):
+        """
+        记录新发现的节点，已存在的节点不会被覆盖
+
+        Args:
+            node_info: dentry/list 返回的节点信息
+        """
+        with self._lock:
+            self._insert(node_info)
+            self._conn.commit()
+
+    def _insert(self, node_info):
+        ancestor_list = node_info.get('ancestorList') or []
+        parent_uuid = ancestor_list[-1].get('dentryUuid') if ancestor_list else None
+        self._conn.execute(
+            "INSERT OR IGNORE INTO dentries "
+            "(dentry_uuid, parent_uuid, name, dentry_type, status, node_json, updated_at, "
+            "version, is_folder, seen_run) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (node_info['dentryUuid'], parent_uuid, node_info.get('name'), node_info.get('dentryType'),
+             STATUS_DISCOVERED, json.dumps(node_info, ensure_ascii=False), time.time(),
+             self.version_of(node_info), 0 if is_file_node(node_info) else 1, self.run_id)
+        )
+
+    def observe(self, node_info):
+        """
+        增量同步：记录本次运行见到的节点，并判断是否需要处理
+
+        新节点、上次未完成的节点、修改版本有变化的文件需要处理；文件夹总是需要重新展开以发现新增和删除的子节点
+
+        Returns:
+            bool: 是否需要处理（同一节点在一次运行中只在第一次见到时可能返回True）
+        """
+        node_uuid = node_info['dentryUuid']
+        if node_uuid in self._seen:
+            return False
+        self._seen.add(node_uuid)
+        version = self.version_of(node_info)
+        is_folder = not is_file_node(node_info)
+        if version is None and not is_folder and not self._warned_version:
+            self._warned_version = True
+            logger.warning(f"文件节点信息中没有修改时间/版本字段（{','.join(self.version_keys)}），增量同步无法发现文档内容的更新，"
+                           f"可通过 SYNC_VERSION_KEYS 配置")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, version FROM dentries WHERE dentry_uuid = ?", (node_uuid,)).fetchone()
+            if row is None:
+                self._insert(node_info)
+                self._conn.commit()
+                return True
+            status, old_version = row
+            changed = not is_folder and status in DONE_STATUSES and status != STATUS_DELETED and \
+                version is not None and old_version is not None and version != old_version
+            if is_folder or changed or status == STATUS_DELETED:
+                status = STATUS_DISCOVERED
+            self._conn.execute(
+                "UPDATE dentries SET status = ?, version = COALESCE(?, version), node_json = ?, name = ?, "
+                "is_folder = ?, seen_run = ?, updated_at = ? WHERE dentry_uuid = ?",
+                (status, version, json.dumps(node_info, ensure_ascii=False), node_info.get('name'),
+                 1 if is_folder else 0, self.run_id, time.time(), node_uuid)
+            )
+            self._conn.commit()
+        if changed:
+            self._changed.add(node_uuid)
+        if status in DONE_STATUSES:
+            return False
+        self._done.discard(node_uuid)
+        return True
+
+    def is_changed(self, dentry_uuid):
+        """
+        是否为内容有更新、需要替换旧文件的节点
+        """
+        return dentry_uuid in self._changed
+
+    def find_deleted(self):
+        """
+        查找上游已删除的节点：以前出现过、本次运行没有出现的节点
+
+        只有本次运行展开了见到的所有文件夹（目录遍历完整）时才能判断，否则返回None
+        """
+        with self._lock:
+            unlisted = self._conn.execute(
+                "SELECT COUNT(*) FROM dentries WHERE seen_run = ? AND is_folder = 1 "
+                "AND (listed_run IS NULL OR listed_run < ?) AND status != ?",
+                (self.run_id, self.run_id, STATUS_NO_RIGHT)).fetchone()[0]
+            if unlisted:
+                logger.warning(f"本次运行有{unlisted}个文件夹未展开，目录遍历不完整，跳过删除检测")
+                return None
+            return self._conn.execute(
+                "SELECT dentry_uuid, name, output_path FROM dentries "
+                "WHERE (seen_run IS NULL OR seen_run < ?) AND status != ?",
+                (self.run_id, STATUS_DELETED)).fetchall()
+
+    def mark(self, dentry_uuid, status, output_path=None, add_attempt=False):
+        """
+        更新节点状态
+
+        Args:
+            dentry_uuid: 节点uuid
+            status: 新状态
+            output_path: 输出路径（可选，不传则保留原值）
+            add_attempt: 是否累加一次尝试次数
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE dentries SET status = ?, output_path = COALESCE(?, output_path), "
+                "attempts = attempts + ?, updated_at = ?, "
+                "listed_run = CASE WHEN ? = ? THEN ? ELSE listed_run END WHERE dentry_uuid = ?",
+                (status, output_path, 1 if add_attempt else 0, time.time(),
+                 status, STATUS_LISTED, self.run_id, dentry_uuid)
+            )
+            self._conn.commit()
+        if status in DONE_STATUSES:
+            self._done.add(dentry_uuid)
+            self._changed.discard(dentry_uuid)
+        else:
+            self._done.discard(dentry_uuid)
+
+    def attempts(self, dentry_uuid):
+        """
+        节点在本次运行中失败的尝试次数
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM dentries WHERE dentry_uuid = ?", (dentry_uuid,)).fetchone()
+        return row[0] if row else 0
+
+    def output_of(self, dentry_uuid):
+        """
+        已完成节点的输出路径（导出为目录，下载线程下载的为文件），未完成时返回None
+        """
+        if dentry_uuid not in self._done:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output_path FROM dentries WHERE dentry_uuid = ?", (dentry_uuid,)).fetchone()
+        return row[0] if row else None
+
+    def content_path(self, digest):
+        with self._lock:
+            row = self._conn.execute("SELECT path, size FROM contents WHERE digest = ?", (digest,)).fetchone()
+        return row
+
+    def record_content(self, digest, path, size):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO contents (digest, path, size) VALUES (?, ?, ?)",
+                               (digest, path, size))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
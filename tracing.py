@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+时间线追踪模块（可选）
+记录每个线程的各处理阶段（打开页面、滚动定位、导出、下载、队列等待等）为 Chrome trace-event 格式，
+可在 chrome://tracing 或 https://ui.perfetto.dev 中按线程查看阻塞和空闲；
+可同时开启采样，定期记录所有线程的调用栈，显示在单独的“采样”进程下。
+事件由写线程流式写入（JSON Array 格式），进程异常退出时已写入的部分同样可以打开
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue
+
+from loguru import logger
+
+# 阶段事件和采样事件分别显示在两个“进程”下
+SPAN_PID = 1
+SAMPLE_PID = 2
+# 采样时记录的调用栈深度
+SAMPLE_DEPTH = 24
+
+
+class Tracer:
+    """
+    未启动时所有记录方法都直接返回，不影响正常运行
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self._origin = time.perf_counter()
+        self._queue = Queue()
+        self._named = set()
+        self._named_lock = threading.Lock()
+        self._counters = {}
+        self._writer_thread = None
+        self._threads = []
+
+    def start(self, path, sample_interval=0, counter_interval=1.0):
+        """
+        Args:
+            path: 输出文件（.json）
+            sample_interval: 采样间隔（秒），0 为不采样
+            counter_interval: 记录计数器（如队列长度）的间隔（秒）
+        """
+        self.path = path
+        self.enabled = True
+        self._writer_thread = threading.Thread(target=self._writer, name="trace-writer", daemon=True)
+        self._writer_thread.start()
+        self._emit({"name": "process_name", "ph": "M", "pid": SPAN_PID, "args": {"name": "crawler"}})
+        self._emit({"name": "process_name", "ph": "M", "pid": SAMPLE_PID, "args": {"name": "sampler"}})
+        self._threads = [threading.Thread(target=self._count, args=(counter_interval,), name="trace-counters",
+                                          daemon=True)]
+        if sample_interval:
+            self._threads.append(threading.Thread(target=self._sample, args=(sample_interval,), name="trace-sampler",
+                                                  daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"时间线追踪已开启，输出到{path}" + (f"，采样间隔{sample_interval * 1000:.0f}ms" if sample_interval else ""))
+
+    def _emit(self, event):
+        self._queue.put(event)
+
+    def _ts(self, t):
+        return round((t - self._origin) * 1e6, 1)
+
+    def _tid(self, thread=None, tid=None, pids=(SPAN_PID,)):
+        """
+        当前线程的ID，第一次出现时记录线程名
+        """
+        if tid is None:
+            thread = threading.current_thread()
+            tid = thread.ident
+        for pid in pids:
+            if (pid, tid) in self._named:
+                continue
+            with self._named_lock:
+                if (pid, tid) in self._named:
+                    continue
+                self._named.add((pid, tid))
+            name = thread.name if thread else str(tid)
+            self._emit({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        return tid
+
+    @contextmanager
+    def span(self, name, cat="stage", **args):
+        """
+        记录一个阶段的开始和耗时
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, cat, start, time.perf_counter() - start, **args)
+
+    def complete(self, name, cat, start, duration, **args):
+        """
+        记录一个已经结束的阶段
+
+        Args:
+            start: 开始时间（time.perf_counter()）
+            duration: 耗时（秒）
+        """
+        if not self.enabled:
+            return
+        event = {"name": name, "cat": cat, "ph": "X", "pid": SPAN_PID, "tid": self._tid(),
+                 "ts": self._ts(start), "dur": round(duration * 1e6, 1)}
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        self._emit(event)
+
+    def counter(self, name, func):
+        """
+        登记一个计数器（如各队列长度），func 返回 {名称: 数值}，开启追踪后定期记录
+        """
+        self._counters[name] = func
+
+    def _count(self, interval):
+        while self.enabled:
+            ts = self._ts(time.perf_counter())
+            for name, func in list(self._counters.items()):
+                try:
+                    values = func()
+                except Exception:
+                    continue
+                if values:
+                    self._emit({"name": name, "ph": "C", "pid": SPAN_PID, "ts": ts, "args": values})
+            time.sleep(interval)
+
+    def _sample(self, interval):
+        """
+        定期读取所有线程的调用栈，调用栈（按函数）不变的连续采样合并为一个事件
+        """
+        own = threading.get_ident()
+        current = {}
+        while self.enabled:
+            now = time.perf_counter()
+            threads = {t.ident: t for t in threading.enumerate()}
+            frames = sys._current_frames()
+            for tid, frame in frames.items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < SAMPLE_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                stack = tuple(stack)
+                previous = current.get(tid)
+                if previous and previous[0] == stack:
+                    continue
+                if previous:
+                    self._emit_sample(tid, threads.get(tid), previous, now)
+                current[tid] = (stack, now)
+            for tid in [x for x in current if x not in frames]:
+                self._emit_sample(tid, threads.get(tid), current.pop(tid), now)
+            time.sleep(interval)
+        # 停止时写入尚未结束的采样
+        now = time.perf_counter()
+        threads = {t.ident: t for t in threading.enumerate()}
+        for tid, sampled in current.items():
+            self._emit_sample(tid, threads.get(tid), sampled, now)
+
+    def _emit_sample(self, tid, thread, sampled, end):
+        stack, start = sampled
+        self._emit({"name": stack[0] if stack else "?", "cat": "sample", "ph": "X", "pid": SAMPLE_PID,
+                    "tid": self._tid(thread, tid, (SAMPLE_PID,)), "ts": self._ts(start),
+                    "dur": round((end - start) * 1e6, 1), "args": {"stack": list(stack)}})
+
+    def _writer(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("[\n")
+            last_flush = time.monotonic()
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    break
+                f.write(json.dumps(event, ensure_ascii=False) + ",\n")
+                if time.monotonic() - last_flush > 1 or self._queue.empty():
+                    f.flush()
+                    last_flush = time.monotonic()
+            f.write(json.dumps({"name": "trace_end", "ph": "i", "s": "g", "pid": SPAN_PID,
+                                "ts": self._ts(time.perf_counter())}) + "\n]\n")
+
+    def close(self):
+        """
+        停止追踪，写入剩余事件并结束文件
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._queue.put(None)
+        self._writer_thread.join()
+        logger.info(f"时间线追踪已写入{self.path}")
+
+
+tracer = Tracer()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+目录树定位模块
+根据 dentry/list 返回的子节点顺序推算节点在虚拟滚动列表中的位置，直接跳转到对应高度，
+只在附近小范围查找，代替从顶部每次300px的线性滚动
+"""
+
+import json
+import os
+import threading
+
+from loguru import logger
+
+# 目录树虚拟列表的类名
+TREE_CLASS = "MAINSITE_CATALOG-node-tree-list"
+
+# 页面内探测脚本：一次调用内完成滚动、等待渲染、查找目标行和读取滚动信息，返回JSON字符串
+PROBE_JS = """
+function(treeClass, rowId, scrollTo, waitMs, center) {
+    const tree = document.getElementsByClassName(treeClass)[0];
+    if (!tree) {
+        return JSON.stringify({tree: false, found: false});
+    }
+    if (scrollTo !== null && scrollTo !== undefined) {
+        tree.scrollTop = Math.max(0, scrollTo);
+    }
+    const selector = '[data-rbd-draggable-id="' + rowId + '"]';
+    return new Promise(resolve => {
+        const deadline = performance.now() + waitMs;
+        const check = () => {
+            const row = document.querySelector(selector);
+            if (!row && performance.now() < deadline) {
+                requestAnimationFrame(check);
+                return;
+            }
+            if (row && center) {
+                row.scrollIntoView({block: 'center'});
+            }
+            const anyRow = tree.querySelector('[data-rbd-draggable-id]');
+            resolve(JSON.stringify({
+                tree: true,
+                found: !!row,
+                scrollTop: tree.scrollTop,
+                clientHeight: tree.clientHeight,
+                scrollHeight: tree.scrollHeight,
+                rowHeight: anyRow ? anyRow.getBoundingClientRect().height : 0
+            }));
+        };
+        // 滚动后等待虚拟列表重新渲染
+        requestAnimationFrame(check);
+    });
+}
+"""
+
+
+class TreeIndex:
+    """
+    记录每个节点在父节点子列表中的序号（所有浏览器共享）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = {}
+        self._child_count = {}
+
+    def record_children(self, children):
+        """
+        按返回顺序记录一页子节点，分页返回时序号顺延
+
+        Args:
+            children: 子节点信息列表
+        """
+        with self._lock:
+            for node_info in children:
+                node_uuid = node_info['dentryUuid']
+                if node_uuid in self._index:
+                    continue
+                ancestor_list = node_info.get('ancestorList') or []
+                parent_uuid = ancestor_list[-1].get('dentryUuid') if ancestor_list else None
+                self._index[node_uuid] = self._child_count.get(parent_uuid, 0)
+                self._child_count[parent_uuid] = self._index[node_uuid] + 1
+
+    def row_position(self, node_info):
+        """
+        推算节点在目录树中的行号（从0开始）
+
+        打开节点页面后树中只展开了该节点的祖先，因此节点之前的行数为：
+        路径上每一层节点在各自父节点中的序号之和，加上祖先节点本身占用的行数
+
+        Returns:
+            int|None: 行号，路径上有序号未知的节点时返回None
+        """
+        path = [x.get('dentryUuid') for x in node_info.get('ancestorList') or []] + [node_info['dentryUuid']]
+        rows = 0
+        known = False
+        with self._lock:
+            for depth, node_uuid in enumerate(path):
+                if node_uuid in self._index:
+                    rows += self._index[node_uuid]
+                    known = True
+                elif known:
+                    # 根节点以下的某一层序号未知，无法推算
+                    return None
+                else:
+                    # 知识库根节点等不在树中显示的祖先节点
+                    continue
+                if depth < len(path) - 1:
+                    rows += 1
+        return rows if known else None
+
+
+class TreeLocator:
+    """
+    单个浏览器的目录树定位器，缓存该浏览器中实测的行高
+    """
+
+    def __init__(self, page, tree_index, idx=0):
+        self.page = page
+        self.tree_index = tree_index
+        self.idx = idx
+        self.row_height = None
+        self.row_offset = int(os.getenv("TREE_ROW_OFFSET", "0"))
+        self.search_steps = int(os.getenv("TREE_SEARCH_STEPS", "3"))
+        self.render_wait = int(os.getenv("TREE_RENDER_WAIT_MS", "300"))
+
+    def probe(self, row_id, scroll_to=None, center=True):
+        """
+        一次页面调用完成：可选地设置目录树滚动高度、等待虚拟列表渲染、查找目标行并滚动到可视区域，
+        同时返回滚动信息和实测行高
+
+        Args:
+            row_id: 目标行的 data-rbd-draggable-id
+            scroll_to: 要滚动到的高度，None 表示保持当前位置
+            center: 找到目标行时是否将其滚动到可视区域中部
+
+        Returns:
+            dict: tree 目录树是否存在，found 目标行是否已渲染，scrollTop/clientHeight/scrollHeight 滚动信息，
+                  rowHeight 行高
+        """
+        state = json.loads(self.page.run_js(PROBE_JS, TREE_CLASS, row_id, scroll_to, self.render_wait, center))
+        if state.get('rowHeight'):
+            self.row_height = state['rowHeight']
+        return state
+
+    def locate(self, node_info, loc):
+        """
+        跳转到推算的位置查找节点，找不到时在上下若干屏内查找
+
+        Returns:
+            元素对象，无法推算或附近没有找到时返回None（由调用方回退到线性滚动）
+        """
+        row_id = node_info['dentryUuid']
+        state = self.probe(row_id)
+        if not state.get('tree'):
+            return None
+        if state['found']:
+            return self.page.ele(loc, timeout=2)
+        row = self.tree_index.row_position(node_info)
+        if row is None or not self.row_height:
+            return None
+        client_height = state['clientHeight']
+        expected_top = (row + self.row_offset) * self.row_height
+        # 让目标行出现在可视区域中部
+        base = expected_top - client_height / 2
+        step = max(client_height * 0.8, self.row_height)
+        for i in range(self.search_steps * 2 + 1):
+            # 依次查找 0, +1, -1, +2, -2 ... 屏
+            offset = (i + 1) // 2 * (1 if i % 2 else -1)
+            top = base + offset * step
+            if top < 0 and offset < 0:
+                continue
+            state = self.probe(row_id, scroll_to=max(0, int(top)))
+            if state['found']:
+                if offset:
+                    logger.info(f"[{self.idx}] 目录树定位偏差{offset}屏")
+                return self.page.ele(loc, timeout=2)
+        logger.info(f"[{self.idx}] 目录树推算位置附近未找到{loc}，回退到逐屏滚动")
+        return None
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+"""
+页面等待模块
+以具体的页面/网络条件（菜单项可见、下载开始、监听静默）代替固定时长的sleep，
+每个步骤有独立的超时时间，并统计每次等待的实际耗时
+"""
+
+import os
+import threading
+import time
+
+from loguru import logger
+
+from metrics import metrics
+from tracing import tracer
+
+# 各步骤默认超时时间（秒），可通过 .env 中的 WAIT_<步骤名大写>_TIMEOUT 覆盖
+DEFAULT_TIMEOUTS = {
+    "network_idle": 10,
+    "page_ready": 10,
+    "menu": 5,
+    "download_begin": 120,
+}
+
+# 文件页面可操作的标志：任一工具栏或下载按钮出现即可开始导出
+PAGE_READY_LOCATORS = [
+    "@data-testid=doc-header-more-button",
+    "@data-testid=bi-toolbar-menu",
+    "#wiki-new-sheet-iframe",
+    "@data-item-key=download",
+]
+
+
+def step_timeout(kind):
+    return float(os.getenv(f"WAIT_{kind.upper()}_TIMEOUT", DEFAULT_TIMEOUTS[kind]))
+
+
+class WaitStats:
+    """
+    按步骤统计等待次数、总耗时、最长耗时和超时次数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, step, elapsed, ok):
+        with self._lock:
+            stat = self._stats.setdefault(step, {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0})
+            stat["count"] += 1
+            stat["total"] += elapsed
+            stat["max"] = max(stat["max"], elapsed)
+            if not ok:
+                stat["timeouts"] += 1
+        metrics.observe("wait_seconds", elapsed, step=step)
+        if not ok:
+            metrics.inc("wait_timeouts_total", step=step)
+
+    def summary(self):
+        with self._lock:
+            return {step: dict(stat, avg=stat["total"] / stat["count"]) for step, stat in self._stats.items()}
+
+    def log_summary(self):
+        for step, stat in sorted(self.summary().items()):
+            logger.info(f"等待[{step}]：{stat['count']}次 平均{stat['avg']:.2f}s 最长{stat['max']:.2f}s "
+                        f"超时{stat['timeouts']}次")
+
+
+wait_stats = WaitStats()
+
+
+class PageWaiter:
+    """
+    绑定到单个浏览器页面的等待器
+    """
+
+    def __init__(self, page, idx=0, stats=None):
+        self.page = page
+        self.idx = idx
+        self.stats = stats or wait_stats
+
+    def _record(self, step, start, ok):
+        elapsed = time.perf_counter() - start
+        self.stats.record(step, elapsed, bool(ok))
+        tracer.complete(step, "wait", start, elapsed, idx=self.idx, ok=bool(ok))
+
+    def network_idle(self, step="network_idle", timeout=None):
+        """
+        等待 dentry/list 监听静默（没有未完成的目标请求）
+        """
+        start = time.perf_counter()
+        ok = self.page.listen.wait_silent(timeout=timeout or step_timeout("network_idle"), targets_only=True)
+        self._record(step, start, ok)
+        if not ok:
+            logger.info(f"[{self.idx}] 等待{step}超时，继续处理")
+        return ok
+
+    def page_ready(self, step="page_ready", timeout=None):
+        """
+        等待文件页面的工具栏或下载按钮出现
+        """
+        start = time.perf_counter()
+        ok = self.page.wait.eles_loaded(PAGE_READY_LOCATORS, timeout=timeout or step_timeout("page_ready"),
+                                        any_one=True)
+        self._record(step, start, ok)
+        return ok
+
+    def visible(self, loc, step, timeout=None, owner=None):
+        """
+        等待元素出现并可见
+
+        Args:
+            loc: 定位符
+            step: 步骤名（用于统计）
+            timeout: 超时时间，默认使用菜单超时
+            owner: 在哪个元素/iframe内查找，默认整个页面
+
+        Returns:
+            元素对象，超时返回None
+        """
+        timeout = timeout or step_timeout("menu")
+        # 未找到的父元素（NoneElement）同样为假值，不能回退到整个页面查找
+        owner = self.page if owner is None else owner
+        start = time.perf_counter()
+        ele = owner.ele(loc, timeout=timeout)
+        if ele:
+            remaining = max(0.1, timeout - (time.perf_counter() - start))
+            if not ele.wait.displayed(timeout=remaining):
+                ele = None
+        self._record(step, start, ele)
+        return ele or None
+
+    def click(self, loc, step, timeout=None, owner=None):
+        """
+        等待元素可见后点击，超时抛出异常
+        """
+        ele = self.visible(loc, step, timeout, owner)
+        if not ele:
+            raise Exception(f"等待{step}超时：{loc}")
+        ele.click()
+        return ele
+
+    def download_begin(self, step="download_begin", timeout=None):
+        """
+        等待浏览器下载任务开始
+
+        Returns:
+            下载任务对象，超时返回False
+        """
+        start = time.perf_counter()
+        mission = self.page.wait.download_begin(timeout=timeout or step_timeout("download_begin"))
+        self._record(step, start, mission)
+        return mission